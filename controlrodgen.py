@@ -11,7 +11,8 @@ class controlRodGen():
                        h2o_void_percent=0,
                        P_imp=None,
                        bank=False,
-                       coreOnly = True):
+                       coreOnly = True,
+                       state = None):
 
         if bank == True:
             self.safeHeight = self.shimHeight = self.regHeight = max(safeHeight,shimHeight,regHeight)
@@ -20,11 +21,11 @@ class controlRodGen():
             self.shimHeight = shimHeight
             self.regHeight = regHeight
 
-        self.voidPercent = h2o_void_percent
-        self.h2o_temp_K = h2o_temp_K
-        self.H2ODensity = (1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K)
+        self.voidPercent = state.h2o_void_percent if state else h2o_void_percent
+        self.h2o_temp_K = state.h2o_temp_K if state else h2o_temp_K
+        self.H2ODensity = state.h2o_density if state else ((1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K))
 
-        self.P_imp = f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1'         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
+        self.P_imp = state.imp if state else (f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1')         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
 
         self.coreOnly = coreOnly
 
@@ -43,7 +44,7 @@ class controlRodGen():
         self.alDensity = 2.70
         self.graphiteDensity = 1.698
         self.boronCarbideDensity = 1.80772
-        self.tmp = h2o_temp_mev
+        self.tmp = state.h2o_temp_mev if state else h2o_temp_mev
 
         self.safePZ()
         self.shimPZ()
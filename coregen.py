@@ -5,21 +5,37 @@ import controlrodgen
 import othergen
 import codesnippets
 import tallies
+import inputloader
+import xslibs
+import deckwriter
+import manifest
+import sweeps
+import plans
 import pandas as pd
 import numpy as np
 import xlrd, openpyxl
 import os
+import argparse
+import concurrent.futures
+import functools
+import contextlib
+import sys
+import collections
 
 
 
 class coreGen():
-    def __init__(self, filepath, df, fueldf, tallydf, settingsdf, row = 0):
+    def __init__(self, filepath, df, fueldf, tallydf, settingsdf, row = 0, inventory = None, resolver = None, likeFuel = False, setupRow = None):
         self.filePath = filepath
         self.df = df
         self.fueldf = fueldf
+        self.inventory = inventory if inventory else fuelgen.fuelInventory(fueldf)      # pass one inventory to every row so the composition math is shared
+        self.resolver = resolver if resolver else xslibs.default_resolver()     # cross-section library lookup, built from gendicts unless an xsdir was given
         self.tallydf = tallydf
         self.settingsdf = settingsdf
         self.row = row
+        self.setupRow = setupRow      # Setup values of a case that is not a row of df (e.g. a sweep point), row then only numbers the deck
+        self.likeFuel = likeFuel      # writes every fuel universe after the first as LIKE-BUT cards of the first
         self.simOptions = None
         self.fuelElements = {}
         self.controlRods = None
@@ -47,35 +63,38 @@ class coreGen():
             "F" : {key:None for key in range(1,31)},    # dictionary for the f ring
         }
         self.matLibs = None
-        self.core = ''
-        self.fuelCellCards = ''         # string with all fuel cell cards
-        self.fuelMatCards = ''          # string with all fuel mat cards
-        self.graphiteCellCard = ''
-        self.gridPlateCards = ''
-        self.coreSources = ''
-        self.controlRodSurfaces = ''    # string with control rod surfaces (these change the change rod heights)
-        self.controlRodCells = ''
-        self.lsCellCards = ''           # string with all lazy susan cell cards
-        self.coreConfigfill = ''
-        self.waterUniverse = ''
-        self.waterMat = ''
-        self.coreWaterCells = ''
-        self.universes = ''
-        self.waterTestCard = ''
-        self.voidCells = ''
-        self.graphiteReflectorCards = ''
-        self.ctCard = ''
-        self.fluxWiresCard = ''
-        self.housingCard = ''
-        self.rabbitCells = ''
-        self.ndCells = ''
-        self.tallycards = ''
-        self.simOptsCard = 'c Settings:\n'
-        self.tallyOptsCard = 'c Tallies:\n'
+        self.state = None   # genfuncs.thermalState shared by every generator of this row
+        self.core = deckwriter.section()
+        self.fuelCellCards = deckwriter.section()         # segments of all fuel cell cards
+        self.fuelMatCards = deckwriter.section()          # segments of all fuel mat cards
+        self.graphiteCellCard = deckwriter.section()
+        self.gridPlateCards = deckwriter.section()
+        self.coreSources = deckwriter.section()
+        self.controlRodSurfaces = deckwriter.section()    # segments of control rod surfaces (these change the change rod heights)
+        self.controlRodCells = deckwriter.section()
+        self.lsCellCards = deckwriter.section()           # segments of all lazy susan cell cards
+        self.coreConfigfill = deckwriter.section()
+        self.waterUniverse = deckwriter.section()
+        self.waterMat = deckwriter.section()
+        self.coreWaterCells = deckwriter.section()
+        self.universes = deckwriter.section()
+        self.waterTestCard = deckwriter.section()
+        self.voidCells = deckwriter.section()
+        self.graphiteReflectorCards = deckwriter.section()
+        self.ctCard = deckwriter.section()
+        self.fluxWiresCard = deckwriter.section()
+        self.housingCard = deckwriter.section()
+        self.rabbitCells = deckwriter.section()
+        self.ndCells = deckwriter.section()
+        self.tallycards = deckwriter.section()
+        self.simOptsCard = deckwriter.section(['c Settings:\n'])
+        self.tallyOptsCard = deckwriter.section(['c Tallies:\n'])
         
         self.averageDensity = 0
 
         self.getSimOptions()
+        self.getMatLibs()
+        self.getThermalState()
         self.getFuel()
         self.getFuelCellCards()
         self.getFuelMatCards()
@@ -100,7 +119,7 @@ class coreGen():
         self.getSimOptionsCard()
 
     def getSimOptions(self):
-        row = self.df.iloc[self.row]    # reads only the current sim row from the dataframe
+        row = self.setupRow if self.setupRow is not None else self.df.iloc[self.row]    # reads only the current sim row from the dataframe
         self.simOptions = {"AddSm" : True if row["Add Sm"] == "Yes" else False,     # sets bool for samarium
                            "H2OTemp" : row["Water Temperature (C)"] + 273.15,       # converts inputted temperature to C 
                            "H2OTemp_MeV" : "{:.6e}".format(genfuncs.k_to_mev(row["Water Temperature (C)"] + 273.15)),    # converts temperature to MeV
@@ -121,6 +140,8 @@ class coreGen():
                            "Rabbit_In" : True if row["Rabbit in Core"] == "Yes" else False,  # sets bool for if the rabbit is in the core (replaces some of the air cells with plastic)
                            "Core Only" : True if row["Scale"] == "Core" else False
                            }
+        if pd.notnull(row.get("H2O Pressure (MPa)")):      # only plans and sweeps set a pressure, the water is at 1 atm otherwise
+            self.simOptions["H2O_Pressure_MPa"] = row["H2O Pressure (MPa)"]
         for elem in self.simOptions["Graphite"]:                # sets core layout universe for graphite elements
             self.coreLayout[elem[0]][int(elem[1:])] = 80        # universe code for graphite elements
         if self.simOptions["AmBe"] != None:                     # sets core layout universe for AmBe source
@@ -132,38 +153,46 @@ class coreGen():
         self.coreLayout['E'][1] = 'Reg'
         self.coreLayout['F'][9] = 'Rabbit'
         
+    def getMatLibs(self):
+        self.matLibs = self.resolver.matLibs(self.simOptions["FTemp"], self.simOptions["H2OTemp"])   # libraries for the fuel and water temperatures of this row
+
     def getSimOptionsCard(self):
         for option in self.simOptions.keys():   # iterates through sim options and writes a line for each option
             self.simOptsCard += f'c {option} = {self.simOptions[option] if type(self.simOptions[option]) != list else ", ".join(self.simOptions[option])}\n'
     
+    def getThermalState(self):
+        self.state = genfuncs.thermal_state(self.simOptions["H2OTemp"], self.simOptions["H2OTemp_MeV"], self.simOptions["FTemp"], self.simOptions["FTemp_MeV"],
+                                            self.simOptions["H2O_Density"], self.simOptions["H2O_Void_Percent"], self.simOptions["P_Importance"], self.matLibs,
+                                            self.simOptions.get("H2O_Pressure_MPa"))
+        if self.simOptions["H2O_Density"] == None:  # if H2O Density was not inputed, use the value calculated from the water temperature
+            self.simOptions["H2O_Density"] = self.state.h2o_density
+
     def getFuel(self):
-        fuelDict = self.fueldf.to_dict('index') # this splits the fueldf dataframe on its rows 
-        for item in fuelDict.keys():
-            self.fuelElements[fuelDict[item]["Fuel Element"]] = {"data":fuelDict[item]} # item is the row number that its at, "Fuel Element" elemenent id which is in the item-th row and the "Fuel Element" column
-            self.fuelElements[fuelDict[item]["Fuel Element"]]["fuelCards"] = fuelgen.fuelGen(
-                f"Core {self.simOptions['CoreNo']}",
-                self.fuelElements[fuelDict[item]["Fuel Element"]]["data"],
-                self.simOptions["H2OTemp"],
-                self.simOptions["H2OTemp_MeV"],
-                self.simOptions["H2O_Density"],
-                self.simOptions["H2O_Void_Percent"],
-                self.simOptions["FTemp"],
-                self.simOptions["FTemp_MeV"],
-                self.simOptions["AddSm"],
-                self.simOptions["HZR_Ratio"],
-                self.simOptions["P_Importance"],
-                self.matLibs
+        coreCol = f"Core {self.simOptions['CoreNo']}"
+        composition = self.inventory.getComposition(self.simOptions["HZR_Ratio"], self.simOptions["AddSm"])
+        massScales = sweeps.mass_scales(self.setupRow) if self.setupRow is not None else {}     # relative masses drawn for each element by a sampleSweep
+        for item in self.inventory.placed(coreCol):     # only the elements that have a position in the desired core configuration are built
+            data = self.inventory.records[item]
+            elementComposition = composition[item]
+            if data["Fuel Element"] in massScales:     # the scaled element works out its own composition instead of using the inventory's
+                data = {**data, **{col:data[col]*scale for col, scale in massScales[data["Fuel Element"]].items()}}
+                elementComposition = None
+            ring = data[coreCol][0]         # gets the ring that its in
+            pos = int(data[coreCol][1:])    # gets the position in the ring
+            if self.coreLayout[ring][pos] != None:     # a contested position is left empty, so it is filled with water below
+                print(f"\n   fatal. multiple element assignments to position {ring}{pos}")
+                self.coreLayout[ring][pos] = None
+                continue
+            self.coreLayout[ring][pos] = data["Fuel Element"]     # places the element
+            self.fuelElements[data["Fuel Element"]] = {"data":data}    # item is the row number that its at, "Fuel Element" elemenent id which is in the item-th row and the "Fuel Element" column
+            self.fuelElements[data["Fuel Element"]]["fuelCards"] = fuelgen.cachedFuelGen(     # reuses the cards from an earlier row when nothing about the element changed
+                coreCol,
+                data,
+                add_samarium=self.simOptions["AddSm"],
+                HZR_Ratio=self.simOptions["HZR_Ratio"],
+                composition=elementComposition,
+                state=self.state
                 )
-            if self.simOptions["H2O_Density"] == None:  # if H2O Density was not inputed, get the calculated value from the first fuel card
-                self.simOptions["H2O_Density"] = self.fuelElements[fuelDict[item]["Fuel Element"]]["fuelCards"].H2ODensity
-
-            if self.matLibs == None:
-                self.matLibs = self.fuelElements[fuelDict[item]["Fuel Element"]]["fuelCards"].matLibs
-            
-            if type(self.fuelElements[fuelDict[item]["Fuel Element"]]["data"][f"Core {self.simOptions['CoreNo']}"]) == str:     # checks to make sure it is in the desired core configuration
-                ring = self.fuelElements[fuelDict[item]["Fuel Element"]]["data"][f"Core {self.simOptions['CoreNo']}"][0]        # gets the ring that its in
-                pos = int(self.fuelElements[fuelDict[item]["Fuel Element"]]["data"][f"Core {self.simOptions['CoreNo']}"][1:])   # gets the position in the ring
-                self.coreLayout[ring][pos] = self.fuelElements[fuelDict[item]["Fuel Element"]]["data"]["Fuel Element"] if self.coreLayout[ring][pos] == None else print(f"\n   fatal. multiple element assignments to position {ring}{pos}")    # places the element
         for ring in self.coreLayout:
             for pos in self.coreLayout[ring].keys():
                 if self.coreLayout[ring][pos] == None:
@@ -171,16 +200,21 @@ class coreGen():
                     print(f"   warning. no element in position {ring}{pos} --- sim {self.row + 1}")
         # print(self.fuelElements)
 
+    def placedFuel(self):
+        '''
+        Yields the fuel cards of every placed element in core layout order
+        '''
+        for ring in self.coreLayout:
+            for pos in self.coreLayout[ring].keys():
+                if self.coreLayout[ring][pos] in self.fuelElements:
+                    yield self.fuelElements[self.coreLayout[ring][pos]]["fuelCards"]
+
     def getAverageDensity(self):
         elementCount = 0
         totalDensity = 0
-        for ring in self.coreLayout:
-            for pos in self.coreLayout[ring].keys():
-                try:
-                    totalDensity += self.fuelElements[self.coreLayout[ring][pos]]["fuelCards"].fuelDensity
-                    elementCount += 1
-                except:
-                    pass
+        for fuel in self.placedFuel():
+            totalDensity += fuel.fuelDensity
+            elementCount += 1
         self.averageDensity = totalDensity / elementCount
 
     def getCoreConfig(self):
@@ -204,12 +238,14 @@ class coreGen():
         self.fuelCellCards += f"c Fuel meat density auto-generated from '{self.filePath}'\n" \
                                "c Calculated fuel meat volume = 387.7713768 cm^3\n" \
                               f"c Average fuel meat density = {'{:.6f}'.format(self.averageDensity)} g/cm^3\n"
-        for ring in self.coreLayout:
-            for pos in self.coreLayout[ring].keys():
-                try:
-                    self.fuelCellCards += self.fuelElements[self.coreLayout[ring][pos]]["fuelCards"].cellCard + '\n'
-                except:
-                    pass
+        ref = None
+        for fuel in self.placedFuel():
+            if self.likeFuel and ref:
+                self.fuelCellCards += fuel.getLikeCellCard(ref)
+            else:
+                self.fuelCellCards += fuel.cellCard     # the card text is shared with the fuelGen object, not copied
+                ref = fuel
+            self.fuelCellCards += '\n'
         self.fuelCellCards += 'c -----------------------------------\n' \
                               'c ------- End Fuel Cell Cards -------\n' \
                               'c -----------------------------------\n'
@@ -219,19 +255,16 @@ class coreGen():
                              'c ---- Begin Fuel Material Cards ----\n' \
                              'c -----------------------------------\n'
         self.fuelCellCards += genfuncs.make_cs(3)
-        for ring in self.coreLayout:
-            for pos in self.coreLayout[ring].keys():
-                try:
-                    self.fuelMatCards += self.fuelElements[self.coreLayout[ring][pos]]["fuelCards"].matCard + '\n'
-                except:
-                    pass
+        for fuel in self.placedFuel():
+            self.fuelMatCards += fuel.matCard
+            self.fuelMatCards += '\n'
         self.fuelCellCards += genfuncs.make_cs(3)
         self.fuelMatCards += 'c -----------------------------------\n' \
                              'c ----- End Fuel Material Cards -----\n' \
                              'c -----------------------------------\n'
 
     def getCoreSources(self):
-        self.sources = fuelgen.sourceGen(self.simOptions["H2O_Density"],self.simOptions["H2OTemp"],self.simOptions["H2OTemp_MeV"],self.simOptions["H2O_Void_Percent"],self.simOptions["AmBe"],self.simOptions["Ir"],self.simOptions["P_Importance"])
+        self.sources = fuelgen.sourceGen(AmBe_loc=self.simOptions["AmBe"], Ir_loc=self.simOptions["Ir"], state=self.state)
         self.coreSources += 'c -----------------------------------\n' \
                             'c -------- Begin Core Sources -------\n' \
                             'c -----------------------------------\n'
@@ -248,11 +281,17 @@ class coreGen():
                             'c -----------------------------------\n'
 
     def getControlRodSurfaces(self):
-        self.controlRods = controlrodgen.controlRodGen(safeHeight=self.simOptions['Safe'], shimHeight=self.simOptions['Shim'], regHeight=self.simOptions['Reg'], h2o_temp_K=self.simOptions["H2OTemp"], h2o_temp_mev=self.simOptions["H2OTemp_MeV"], h2o_density=self.simOptions["H2O_Density"], h2o_void_percent=self.simOptions["H2O_Void_Percent"], P_imp=self.simOptions["P_Importance"],coreOnly=self.simOptions["Core Only"])
+        self.controlRods = controlrodgen.controlRodGen(safeHeight=self.simOptions['Safe'], shimHeight=self.simOptions['Shim'], regHeight=self.simOptions['Reg'], coreOnly=self.simOptions["Core Only"], state=self.state)
         self.controlRodSurfaces += 'c -----------------------------------\n' \
                                    'c ---- Begin Control Rod Surfaces ---\n' \
                                    'c -----------------------------------\n'
-        self.controlRodSurfaces += genfuncs.make_cs(3) + self.controlRods.safeSurfaces + genfuncs.make_cs(3) + self.controlRods.shimSurfaces + genfuncs.make_cs(3) + self.controlRods.regSurfaces + genfuncs.make_cs(3)
+        self.controlRodSurfaces += genfuncs.make_cs(3)
+        self.controlRodSurfaces += self.controlRods.safeSurfaces
+        self.controlRodSurfaces += genfuncs.make_cs(3)
+        self.controlRodSurfaces += self.controlRods.shimSurfaces
+        self.controlRodSurfaces += genfuncs.make_cs(3)
+        self.controlRodSurfaces += self.controlRods.regSurfaces
+        self.controlRodSurfaces += genfuncs.make_cs(3)
         self.controlRodSurfaces += 'c -----------------------------------\n' \
                                    'c ----- End Control Rod Surfaces ----\n' \
                                    'c -----------------------------------\n'
@@ -262,13 +301,18 @@ class coreGen():
                                 'c ----- Begin Control Rod Cells -----\n' \
                                 'c -----------------------------------\n'
         self.controlRodCells += genfuncs.make_cs(3)
-        self.controlRodCells += self.controlRods.safeCellCard + genfuncs.make_cs(3) + self.controlRods.shimCellCard + genfuncs.make_cs(3) + self.controlRods.regCellCard + genfuncs.make_cs(3)
+        self.controlRodCells += self.controlRods.safeCellCard
+        self.controlRodCells += genfuncs.make_cs(3)
+        self.controlRodCells += self.controlRods.shimCellCard
+        self.controlRodCells += genfuncs.make_cs(3)
+        self.controlRodCells += self.controlRods.regCellCard
+        self.controlRodCells += genfuncs.make_cs(3)
         self.controlRodCells += 'c -----------------------------------\n' \
                                 'c ------ End Control Rod Cells ------\n' \
                                 'c -----------------------------------\n'
         
     def getLSCellCards(self):
-        self.ls = othergen.lsGen(self.simOptions["P_Importance"])
+        self.ls = othergen.cachedComponent(othergen.lsGen, self.simOptions["P_Importance"])     # components are rendered once per variant of their inputs, not once per row
         self.lsCellCards += 'c -----------------------------------\n' \
                             'c ------- Begin LS Cell Cards -------\n' \
                             'c -----------------------------------\n'
@@ -282,7 +326,7 @@ class coreGen():
                             'c -----------------------------------\n'
 
     def getWater(self):
-        self.water = othergen.waterGen(self.simOptions["H2O_Density"],self.simOptions["H2OTemp"],self.simOptions["H2OTemp_MeV"],self.simOptions["H2O_Void_Percent"],self.simOptions["P_Importance"],self.matLibs, self.simOptions["Core Only"])
+        self.water = othergen.waterGen(coreOnly=self.simOptions["Core Only"], state=self.state)
         self.waterUniverse += 'c -----------------------------------\n' \
                               'c ---------- Water Universe ---------\n' \
                               'c -----------------------------------\n'
@@ -304,7 +348,7 @@ class coreGen():
         self.waterMat += self.water.waterMat
 
     def getGridPlates(self):
-        self.gridPlates = othergen.gridPlatesGen(self.simOptions["P_Importance"])
+        self.gridPlates = othergen.cachedComponent(othergen.gridPlatesGen, self.simOptions["P_Importance"])
 
         self.gridPlateCards += 'c -----------------------------------\n' \
                                'c --------- Grid Plate Cards --------\n' \
@@ -315,7 +359,7 @@ class coreGen():
         self.gridPlateCards += self.gridPlates.altLowerPlate
 
     def getGraphiteReflector(self):
-        self.graphiteReflector = othergen.graphiteReflector(self.simOptions["P_Importance"])
+        self.graphiteReflector = othergen.cachedComponent(othergen.graphiteReflector, self.simOptions["P_Importance"])
 
         self.graphiteReflectorCards += 'c -----------------------------------\n' \
                                        'c ----- Graphite Reflector Cards ----\n' \
@@ -324,7 +368,7 @@ class coreGen():
         self.graphiteReflectorCards += self.graphiteReflector.reflectorCells
 
     def getVoidCells(self):
-        self.void = othergen.voidCells(self.simOptions["P_Importance"], self.simOptions["Core Only"])
+        self.void = othergen.cachedComponent(othergen.voidCells, self.simOptions["P_Importance"], self.simOptions["Core Only"])
         self.voidCells += 'c -----------------------------------\n' \
                           'c --------- Void Cell Cards ---------\n' \
                           'c -----------------------------------\n'
@@ -332,7 +376,7 @@ class coreGen():
         self.voidCells += self.void.voidCells
 
     def getGraphiteCellCard(self):
-        self.graphite = fuelgen.graphiteGen(self.simOptions["H2O_Density"],self.simOptions["H2OTemp"], self.simOptions["H2OTemp_MeV"],self.simOptions["H2O_Void_Percent"],self.simOptions["P_Importance"])
+        self.graphite = fuelgen.graphiteGen(state=self.state)
         self.graphiteCellCard += 'c -----------------------------------\n' \
                                  'c -------- Graphite Cell Card -------\n' \
                                  'c -----------------------------------\n'
@@ -359,7 +403,7 @@ class coreGen():
                           'c -----------------------------------\n'
 
     def getCT(self):
-        self.ct = othergen.centralThimbleGen(self.simOptions["H2O_Density"],self.simOptions["H2OTemp"],self.simOptions["H2OTemp_MeV"],self.simOptions["H2O_Void_Percent"],self.simOptions["CT_Open"],self.simOptions["P_Importance"],self.simOptions["Core Only"])
+        self.ct = othergen.cachedComponent(othergen.centralThimbleGen, CT_open=self.simOptions["CT_Open"], coreOnly=self.simOptions["Core Only"], state=self.state)
         self.ctCard += 'c -----------------------------------\n' \
                        'c --------- Central Thimble ---------\n' \
                        'c -----------------------------------\n'
@@ -367,7 +411,7 @@ class coreGen():
         self.ctCard += self.ct.ctCells
 
     def getFluxWires(self):
-        self.fluxWires = othergen.fluxWires(self.simOptions["H2O_Density"],self.simOptions["H2OTemp"],self.simOptions["H2OTemp_MeV"],self.simOptions["H2O_Void_Percent"],self.simOptions["P_Importance"])
+        self.fluxWires = othergen.fluxWires(state=self.state)
         self.fluxWiresCard += 'c -----------------------------------\n' \
                               'c ------------ Flux Wires -----------\n' \
                               'c -----------------------------------\n'
@@ -375,7 +419,7 @@ class coreGen():
         self.fluxWiresCard += self.fluxWires.fluxWireCard
 
     def getPoolHousing(self):
-        self.housing = othergen.poolHousing(self.simOptions["P_Importance"])
+        self.housing = othergen.cachedComponent(othergen.poolHousing, self.simOptions["P_Importance"])
         self.housingCard += 'c -----------------------------------\n' \
                             'c ----------- Pool Housing ----------\n' \
                             'c -----------------------------------\n'
@@ -383,7 +427,7 @@ class coreGen():
         self.housingCard += self.housing.housingCells
 
     def getRabbit(self):
-        self.rabbit = othergen.rabbit(self.simOptions["H2O_Density"],self.simOptions["H2OTemp"],self.simOptions["H2OTemp_MeV"],self.simOptions["H2O_Void_Percent"],self.simOptions["Rabbit_In"],self.simOptions["P_Importance"])
+        self.rabbit = othergen.cachedComponent(othergen.rabbit, rabbit_in=self.simOptions["Rabbit_In"], state=self.state)
         self.rabbitCells += 'c -----------------------------------\n' \
                             'c -------- Begin Rabbit Cells -------\n' \
                             'c -----------------------------------\n'
@@ -395,7 +439,7 @@ class coreGen():
                             'c -----------------------------------\n'
 
     def getNeutronDetectors(self):
-        self.neutronDetectors = othergen.neutronDetectors(self.simOptions["P_Importance"])
+        self.neutronDetectors = othergen.cachedComponent(othergen.neutronDetectors, self.simOptions["P_Importance"])
         self.ndCells += 'c -----------------------------------\n' \
                         'c -------- Neutron Detectors --------\n' \
                         'c -----------------------------------\n'
@@ -436,7 +480,13 @@ class coreGen():
             self.tallyOptsCard += self.tallies[tally].optsCard
         # print(self.tallycards)
 
-    def writeFile(self):
+    def getDeck(self, compact=False, shareable=False):
+        '''
+        Lays out the whole input deck as one section, every card block is referenced rather than copied.
+        compact drops every whole-line comment and the padding (see deckwriter.compact_deck),
+        shareable marks the blocks that stay the same across a sweep so getSplitDeck() can move them to include files
+        '''
+        share = deckwriter.shareable if shareable else (lambda block: block)
         cellCardOpener = "c ----------------------------------------------------------------------------------------------------\n" \
                          "c -------------------------------------------- CELL CARDS --------------------------------------------\n" \
                          "c ----------------------------------------------------------------------------------------------------\n"
@@ -452,168 +502,463 @@ class coreGen():
         sourceDefOpener = 'c -----------------------------------\n' \
                           'c -------- Source Definition --------\n' \
                           'c -----------------------------------\n'
-        dirPath = './Exports'
-        if not os.path.exists(dirPath):
-            os.makedirs(dirPath)
-        filePath = f'./Exports/reedCore{self.simOptions["CoreNo"]}_{self.row+1}_{self.simOptions["Safe"]}_{self.simOptions["Shim"]}_{self.simOptions["Reg"]}'
-        try:
-            f = open(f'{filePath}.i', 'x')
-        except:
-            filePath = genfuncs.find_available_name(filePath)
-            f = open(f'{filePath}.i', 'x')
+        deck = deckwriter.section()
 
         '''
         Write Preamble
         '''
-        f.write(codesnippets.reedReactorTitle)
-        f.write(genfuncs.make_cs(10))
-        f.write(self.simOptsCard)
-        f.write(genfuncs.make_cs(10))
+        deck += deckwriter.static(codesnippets.reedReactorTitle)
+        deck += genfuncs.make_cs(10)
+        deck += self.simOptsCard
+        deck += genfuncs.make_cs(10)
         if self.tallies != {}:
-            f.write(self.tallyOptsCard)
-            f.write(genfuncs.make_cs(10))
+            deck += self.tallyOptsCard
+            deck += genfuncs.make_cs(10)
         
         '''
         Writing Cell Cards
         '''
-        f.write(cellCardOpener)
-        f.write(genfuncs.make_cs(10))
-        f.write(self.coreConfigfill)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.universes)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.waterTestCard)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.voidCells)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.gridPlateCards)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.graphiteReflectorCards)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.lsCellCards)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.coreWaterCells)
+        deck += cellCardOpener
+        deck += genfuncs.make_cs(10)
+        deck += self.coreConfigfill
+        deck += genfuncs.make_cs(5)
+        deck += self.universes
+        deck += genfuncs.make_cs(5)
+        deck += self.waterTestCard
+        deck += genfuncs.make_cs(5)
+        deck += share(self.voidCells)
+        deck += genfuncs.make_cs(5)
+        deck += share(self.gridPlateCards)
+        deck += genfuncs.make_cs(5)
+        deck += share(self.graphiteReflectorCards)
+        deck += genfuncs.make_cs(5)
+        deck += share(self.lsCellCards)
+        deck += genfuncs.make_cs(5)
+        deck += self.coreWaterCells
         if not self.simOptions["Core Only"]:
-            f.write(genfuncs.make_cs(5))
-            f.write(self.housingCard)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.ctCard)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.fluxWiresCard)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.rabbitCells)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.controlRodCells)
-        f.write(genfuncs.make_cs(5))
-        f.write(self.ndCells)
-        f.write(genfuncs.make_cs(5))
+            deck += genfuncs.make_cs(5)
+            deck += share(self.housingCard)
+        deck += genfuncs.make_cs(5)
+        deck += self.ctCard
+        deck += genfuncs.make_cs(5)
+        deck += self.fluxWiresCard
+        deck += genfuncs.make_cs(5)
+        deck += self.rabbitCells
+        deck += genfuncs.make_cs(5)
+        deck += self.controlRodCells
+        deck += genfuncs.make_cs(5)
+        deck += share(self.ndCells)
+        deck += genfuncs.make_cs(5)
 
         '''
         Writing Surface Cards
         '''
-        f.write(surfaceCardOpener)
-        f.write(genfuncs.make_cs(10))
+        deck += surfaceCardOpener
+        deck += genfuncs.make_cs(10)
         if self.simOptions["Core Only"]:
-            f.write(codesnippets.modelSurfacesCore)
+            deck += deckwriter.static(codesnippets.modelSurfacesCore)
         else:
-            f.write(codesnippets.modelSurfacesFull)
-        f.write(genfuncs.make_cs(5))
-        f.write(codesnippets.gridPlateSurfaces)
-        f.write(genfuncs.make_cs(5))
-        f.write(codesnippets.graphiteReflectorSurfaces)
-        f.write(genfuncs.make_cs(5))
-        f.write(codesnippets.lsSurfaces)
-        f.write(genfuncs.make_cs(5))
-        f.write(codesnippets.ndSurfaces)
-        f.write(genfuncs.make_cs(5))
+            deck += deckwriter.static(codesnippets.modelSurfacesFull)
+        deck += genfuncs.make_cs(5)
+        deck += deckwriter.static(codesnippets.gridPlateSurfaces)
+        deck += genfuncs.make_cs(5)
+        deck += deckwriter.static(codesnippets.graphiteReflectorSurfaces)
+        deck += genfuncs.make_cs(5)
+        deck += deckwriter.static(codesnippets.lsSurfaces)
+        deck += genfuncs.make_cs(5)
+        deck += deckwriter.static(codesnippets.ndSurfaces)
+        deck += genfuncs.make_cs(5)
         if self.simOptions["Core Only"]:
-            f.write(codesnippets.coreWaterSurfacesCore)
+            deck += deckwriter.static(codesnippets.coreWaterSurfacesCore)
         else:
-            f.write(codesnippets.coreWaterSurfacesFull)
-        f.write(genfuncs.make_cs(5))
-        f.write(codesnippets.ctSurfaces)
-        f.write(genfuncs.make_cs(5))
-        f.write(codesnippets.sourcesSurfaces)
-        f.write(genfuncs.make_cs(5))
-        f.write(codesnippets.rabbitSurfaces)
-        f.write(genfuncs.make_cs(5))
-        f.write(codesnippets.controlRodTubes)
-        f.write(genfuncs.make_cs(3))
-        f.write(self.controlRodSurfaces)
-        f.write(genfuncs.make_cs(5))
+            deck += deckwriter.static(codesnippets.coreWaterSurfacesFull)
+        deck += genfuncs.make_cs(5)
+        deck += deckwriter.static(codesnippets.ctSurfaces)
+        deck += genfuncs.make_cs(5)
+        deck += deckwriter.static(codesnippets.sourcesSurfaces)
+        deck += genfuncs.make_cs(5)
+        deck += deckwriter.static(codesnippets.rabbitSurfaces)
+        deck += genfuncs.make_cs(5)
+        deck += deckwriter.static(codesnippets.controlRodTubes)
+        deck += genfuncs.make_cs(3)
+        deck += self.controlRodSurfaces
+        deck += genfuncs.make_cs(5)
         if not self.simOptions["Core Only"]:
-            f.write(codesnippets.poolHousingSurfaces)
-            f.write(genfuncs.make_cs(5))
-        f.write(codesnippets.fuelSurfaces)
-        f.write(genfuncs.make_cs(5))
+            deck += deckwriter.static(codesnippets.poolHousingSurfaces)
+            deck += genfuncs.make_cs(5)
+        deck += deckwriter.static(codesnippets.fuelSurfaces)
+        deck += genfuncs.make_cs(5)
 
         '''
         Writing Data Cards
         '''
-        f.write(dataCardOpener)
-        f.write(genfuncs.make_cs(10))
-        f.write(genMatsOpener)
-        f.write(genfuncs.make_cs(5))
-        f.write(codesnippets.airMat)
-        f.write(genfuncs.make_cs(3))
+        deck += dataCardOpener
+        deck += genfuncs.make_cs(10)
+        deck += genMatsOpener
+        deck += genfuncs.make_cs(5)
+        deck += deckwriter.static(codesnippets.airMat)
+        deck += genfuncs.make_cs(3)
         if self.simOptions["CT_Open"]:
-            f.write(codesnippets.nitrogenMat)
-            f.write(genfuncs.make_cs(3))
-        f.write(self.waterMat)
-        f.write(genfuncs.make_cs(3))
-        f.write(codesnippets.alMat_1)
-        f.write(genfuncs.make_cs(3))
-        f.write(codesnippets.alMat_2)
-        f.write(genfuncs.make_cs(3))
-        f.write(codesnippets.ssMat)
-        f.write(genfuncs.make_cs(3))
-        f.write(codesnippets.graphiteMat)
-        f.write(genfuncs.make_cs(3))
-        f.write(codesnippets.b4cMat)
-        f.write(genfuncs.make_cs(3))
-        f.write(codesnippets.zirconiumMat)
-        f.write(genfuncs.make_cs(3))
+            deck += deckwriter.static(codesnippets.nitrogenMat)
+            deck += genfuncs.make_cs(3)
+        deck += self.waterMat
+        deck += genfuncs.make_cs(3)
+        deck += deckwriter.static(codesnippets.alMat_1)
+        deck += genfuncs.make_cs(3)
+        deck += deckwriter.static(codesnippets.alMat_2)
+        deck += genfuncs.make_cs(3)
+        deck += deckwriter.static(codesnippets.ssMat)
+        deck += genfuncs.make_cs(3)
+        deck += deckwriter.static(codesnippets.graphiteMat)
+        deck += genfuncs.make_cs(3)
+        deck += deckwriter.static(codesnippets.b4cMat)
+        deck += genfuncs.make_cs(3)
+        deck += deckwriter.static(codesnippets.zirconiumMat)
+        deck += genfuncs.make_cs(3)
         if not self.simOptions["Core Only"]:
-            f.write(codesnippets.concreteMat)
-            f.write(genfuncs.make_cs(3))
+            deck += deckwriter.static(codesnippets.concreteMat)
+            deck += genfuncs.make_cs(3)
         if self.simOptions["Rabbit_In"]:
-            f.write(codesnippets.plasticMat)
-            f.write(genfuncs.make_cs(3))
-        f.write(genfuncs.make_cs(2))
-        f.write(self.fuelMatCards)
-        f.write(genfuncs.make_cs(5))
+            deck += deckwriter.static(codesnippets.plasticMat)
+            deck += genfuncs.make_cs(3)
+        deck += genfuncs.make_cs(2)
+        deck += self.fuelMatCards
+        deck += genfuncs.make_cs(5)
         if self.tallies != {}:
-            f.write(self.tallycards)
-            f.write(genfuncs.make_cs(5))
-        f.write(sourceDefOpener)
-        f.write(genfuncs.make_cs(3))
-        f.write(codesnippets.sourceDef)
-        f.write(genfuncs.make_cs(5))
-        f.write('mode ' + ' '.join(self.simOptions["P_Importance"]) + '\n')
-        f.write(genfuncs.make_cs(3))
-        f.write('kcode 100000 1 15 115 $ kcode card, NIST default is 20000 neutrons, discard 5, run 105 total active cycles\n')
-        f.write(genfuncs.make_cs(3))
-        f.write('kopts blocksize=10 kinetics=yes precursor=yes\nc')
-        
-        
-        
+            deck += self.tallycards
+            deck += genfuncs.make_cs(5)
+        deck += sourceDefOpener
+        deck += genfuncs.make_cs(3)
+        deck += deckwriter.static(codesnippets.sourceDef)
+        deck += genfuncs.make_cs(5)
+        deck += 'mode ' + ' '.join(self.simOptions["P_Importance"]) + '\n'
+        deck += genfuncs.make_cs(3)
+        deck += 'kcode 100000 1 15 115 $ kcode card, NIST default is 20000 neutrons, discard 5, run 105 total active cycles\n'
+        deck += genfuncs.make_cs(3)
+        deck += 'kopts blocksize=10 kinetics=yes precursor=yes\nc'
+
+        if compact:
+            return deckwriter.compact_deck(deck)
+        return deck
+
+    def getFileName(self):
+        return f'reedCore{self.simOptions["CoreNo"]}_{self.row+1}_{self.simOptions["Safe"]}_{self.simOptions["Shim"]}_{self.simOptions["Reg"]}'
+
+    def getSplitDeck(self, compact=False, layout='flat'):
+        '''
+        The deck as a per-case overlay plus the shared include files it pulls in with READ FILE= (see deckwriter.split_shared).
+        The static geometry and materials and the particle-only components go to the includes, which are named by their contents
+        and kept once in the export root whatever the layout
+        '''
+        return deckwriter.split_shared(self.getDeck(shareable=True), compact, genfuncs.include_prefix(layout))
 
-        f.close()
+    def getArchiveMembers(self, layout='flat', compact=False, shared=False):
+        '''
+        [(member name, bytes), ...] for writing the deck (and its shared includes) into an archive, members follow the same layout as files in ./Exports
+        '''
+        fileName = self.getFileName()
+        dirPath = genfuncs.export_dir('', self.simOptions["CoreNo"], fileName, layout)
+        if not shared:
+            return [(os.path.join(dirPath, f'{fileName}.i'), self.getDeck(compact).tobytes())]
+        deck, includes = self.getSplitDeck(compact, layout)
+        return list(includes.items()) + [(os.path.join(dirPath, f'{fileName}.i'), deck.tobytes())]
+
+    def writeFile(self, overwrite=False, layout='flat', compact=False, shared=False, namers=None):
+        '''
+        Writes the deck under ./Exports, namers ({directory: genfuncs.outputNamer}) is shared by every deck of a run so each directory is listed once
+        '''
+        namers = namers if namers is not None else {}
+        rootPath = './Exports'
+        fileName = self.getFileName()
+        dirPath = genfuncs.export_dir(rootPath, self.simOptions["CoreNo"], fileName, layout)
+        os.makedirs(dirPath, exist_ok=True)     # exist_ok so parallel writers do not race on creating the directory
+        if shared:      # every deck reads the includes from the export root, so each one is only written once
+            deck, includes = self.getSplitDeck(compact, layout)
+            for name, data in includes.items():
+                includePath = os.path.join(rootPath, name)
+                if not os.path.exists(includePath):     # named by content, an existing include already holds these bytes
+                    tmpPath = f'{includePath}.{os.getpid()}.tmp'
+                    with open(tmpPath, 'wb') as f:
+                        f.write(data)
+                    os.replace(tmpPath, includePath)
+        else:
+            deck = self.getDeck(compact)
+        if overwrite:   # incremental runs replace the row's previous deck instead of adding _1, _2, ...
+            filePath = os.path.join(dirPath, fileName)
+            tmpPath = f'{filePath}.i.{os.getpid()}.tmp'
+            with open(tmpPath, 'wb') as f:
+                deck.write(f)
+            os.replace(tmpPath, f'{filePath}.i')
+        else:
+            if dirPath not in namers:
+                namers[dirPath] = genfuncs.outputNamer(dirPath)
+            filePath, f = namers[dirPath].claim(fileName)     # never overwrites, adds _1, _2, ... to the name instead
+            with f:
+                deck.write(f)
+        if layout != 'flat':    # lets tools find a deck without listing the fanned out directories
+            genfuncs.append_index(rootPath, os.path.basename(filePath), f'{filePath}.i')
 
         print(f'created {filePath}')
-
-def run(filePath):
-    simdf = pd.read_excel(filePath, sheet_name="Setup", usecols="A:R", engine="openpyxl")
-    simdf.dropna(subset="Core Number", inplace=True) #removes rows that contain empty values
-    fueldf = pd.read_excel(filePath, sheet_name="Fuel Info", usecols="A:Y", engine="openpyxl")
-    tallydf = pd.read_excel(filePath, sheet_name="Tallies", usecols="A:G", engine="openpyxl")
-    tallydf.dropna(subset="Power (W)", inplace=True) #removes rows that contain empty values
-    settingsdf = pd.read_excel(filePath, sheet_name="Settings", usecols="B:F", engine="openpyxl")
+        return f'{filePath}.i'
+
+def run(filePath, cache=True, jobs=1, shard=None, xsdir=None, incremental=False, layout='flat', archive=None, compact=False, likeFuel=False, shared=False,
+        sweep=None, base=1, sample=None, tables=None, stream=False):
+    '''
+    Writes a deck for every Setup row (every case when filePath is a plan file, see plans), for every point of sweep ({axis: values}, see sweeps.AXES)
+    laid over Setup row base (counted from 1), or for every case of sample (sweeps.sampleSweep arguments, e.g. {'n': 1000, 'axes': {'water_temp': 'normal:20:2'}}).
+    tables reads sheets from CSV/Parquet files instead of the workbook, e.g. {'Fuel Info': 'inventory.parquet'}.
+    stream reads the Setup sheet one row at a time while the decks are written (see inputloader.stream_setup)
+    '''
+    if archive == '-':      # the tar stream owns stdout, so progress and warnings go to stderr
+        with contextlib.redirect_stdout(sys.stderr):
+            return generate(filePath, cache, jobs, shard, xsdir, incremental, layout, archive, compact, likeFuel, shared, sweep, base, sample, tables, stream)
+    return generate(filePath, cache, jobs, shard, xsdir, incremental, layout, archive, compact, likeFuel, shared, sweep, base, sample, tables, stream)
+
+def loadInputs(filePath, cache=True, xsdir=None, tables=None, setup=True):
+    '''
+    (simdf, fueldf, tallydf, settingsdf, inventory, resolver) for a workbook, with the sheets in tables read from CSV/Parquet instead.
+    simdf is left empty when setup is False
+    '''
+    # the sidecar cache skips openpyxl when the workbook has not changed, tables are read directly
+    simdf, fueldf, tallydf, settingsdf = inputloader.load_inputs(filePath, tables, cache, setup)
     # print(settingsdf)
-    cores = {}
-    for row in range(len(simdf.index)):
-        cores[row] = coreGen(filePath, simdf, fueldf, tallydf, settingsdf, row)
-        cores[row].writeFile()
-            
-
-run("./MCNPCoreGen.xlsx")
\ No newline at end of file
+    inventory = fuelgen.fuelInventory(fueldf)   # composition math for the whole fuel sheet, shared by every row
+    resolver = xslibs.xsResolver.fromXsdir(xsdir) if xsdir else xslibs.default_resolver()
+    return simdf, fueldf, tallydf, settingsdf, inventory, resolver
+
+def makeCases(simdf, inventory, sweep=None, base=1, sample=None, plan=None):
+    '''
+    What stands in for the Setup rows: the cases of a plan file, a sweeps.gridSweep for sweep, a sweeps.sampleSweep for sample,
+    or None for the rows themselves
+    '''
+    if plan:
+        if sweep or sample:
+            print('   comment. the plan file lists its own cases, ignoring the sweep and sample options')
+        return plans.compile_plan(plan, simdf, inventory)
+    if sweep:
+        return sweeps.gridSweep(simdf.iloc[base-1], **sweep)
+    if sample:      # masses are drawn for the elements placed in the base row's core
+        baseRow = simdf.iloc[base-1]
+        cases = sweeps.sampleSweep(baseRow, elements=sweeps.placed_elements(inventory, baseRow['Core Number']), **sample)
+        print(f'   comment. drawing {cases.n} {cases.method} samples with seed {cases.seed}')
+        return cases
+    return None
+
+def caseSource(filePath, plan=None, sweep=None, sample=None):
+    '''
+    Name of what a run's cases come from, the same precedence as makeCases (None for the Setup rows)
+    '''
+    if plan:
+        return f'plan-{os.path.splitext(os.path.basename(filePath))[0]}'
+    if sweep:
+        return 'sweep'
+    if sample:
+        return 'sample'
+    return None
+
+def readPlan(filePath, tables=None):
+    '''
+    (plan, workbook, tables) for a plan file, (None, filePath, tables) for a workbook. Tables the plan names are merged under the given ones
+    '''
+    tables = dict(tables) if tables else {}
+    if not plans.is_plan(filePath):
+        return None, filePath, tables
+    plan = plans.read_plan(filePath)
+    return plan, plan.get('workbook'), {**plans.plan_tables(plan), **tables}
+
+def streamable(plan, workbook, sweep=None, sample=None):
+    '''
+    Whether the Setup sheet can be streamed, plans, sweeps, and samples bring their own cases and only read the sheet for a base row
+    '''
+    if plan or sweep or sample or not workbook:
+        print('   comment. only the Setup sheet of a workbook can be streamed, reading the inputs as usual')
+        return False
+    return True
+
+def iterDecks(filePath, cache=True, xsdir=None, likeFuel=False, sweep=None, base=1, sample=None, tables=None, stream=False):
+    '''
+    Lazily yields a built coreGen for every Setup row, or for every point of sweep (e.g. {'safe': '0:100:5', 'water_temp': [20, 40]}) or case of sample
+    laid over Setup row base. Nothing is written, the next deck is only built when the caller asks for it
+    '''
+    plan, workbook, tables = readPlan(filePath, tables)
+    stream = stream and streamable(plan, workbook, sweep, sample)
+    simdf, fueldf, tallydf, settingsdf, inventory, resolver = loadInputs(workbook, cache, xsdir, tables, setup=not stream)
+    filePath = tables.get('Fuel Info', workbook)     # named in the fuel cell cards as where the densities came from
+    cases = inputloader.stream_setup(workbook) if stream else makeCases(simdf, inventory, sweep, base, sample, plan)
+    if stream:
+        for row, setupRow in cases:
+            yield coreGen(filePath, simdf, fueldf, tallydf, settingsdf, row, inventory, resolver, likeFuel, setupRow)
+    elif cases is not None:
+        for row, setupRow in enumerate(cases):
+            yield coreGen(filePath, simdf, fueldf, tallydf, settingsdf, row, inventory, resolver, likeFuel, setupRow)
+    else:
+        for row in range(len(simdf.index)):
+            yield coreGen(filePath, simdf, fueldf, tallydf, settingsdf, row, inventory, resolver, likeFuel)
+
+def generate(filePath, cache=True, jobs=1, shard=None, xsdir=None, incremental=False, layout='flat', archive=None, compact=False, likeFuel=False, shared=False,
+             sweep=None, base=1, sample=None, tables=None, stream=False):
+    shard = genfuncs.parse_shard(shard) if shard else None      # a bad spec fails before anything is read
+    plan, workbook, tables = readPlan(filePath, tables)
+    source = caseSource(filePath, plan, sweep, sample)     # each source keeps its own incremental manifest
+    stream = stream and streamable(plan, workbook, sweep, sample)
+    simdf, fueldf, tallydf, settingsdf, inventory, resolver = loadInputs(workbook, cache, xsdir, tables, setup=not stream)
+    filePath = tables.get('Fuel Info', workbook)     # named in the fuel cell cards as where the densities came from
+    cases = None if stream else makeCases(simdf, inventory, sweep, base, sample, plan)    # plan cases, sweep points, or samples stand in for the Setup rows, each is built by the worker that gets it
+    inputs = (filePath, simdf, fueldf, tallydf, settingsdf, inventory, resolver, cases, {})     # {} holds this run's output namers
+    if stream:      # (row, setup row) pairs, the sheet is only read as far as the workers have got
+        rows = inputloader.stream_setup(workbook)
+    else:
+        rows = range(len(simdf.index) if cases is None else len(cases))
+    sampleTables = sweeps.sample_tables(cases) if cases is not None else {}     # every sampled value, to pair the decks with their inputs
+    if shard:   # only generates this node's share of the Setup rows, e.g. shard="3/16"
+        shardNo, shardCount = shard
+        if stream:
+            rows = (case for case in rows if case[0] % shardCount == shardNo-1)
+        else:
+            rows = rows[shardNo-1::shardCount]      # round-robin on the row index so every node agrees on the split without coordinating
+    jobs = jobs if jobs > 0 else os.cpu_count()     # jobs=0 uses every core on the machine
+    if archive:     # every deck goes into one archive, the workers hand the rendered decks back to be added in row order
+        if incremental:
+            print('   comment. incremental runs need the decks on disk, ignoring it while writing an archive')
+        with deckwriter.deckArchive(archive) as out:
+            for name, table in sampleTables.items():
+                out.add(name, table.encode())
+            for members in mapRows(functools.partial(archiveRow, layout=layout, compact=compact, likeFuel=likeFuel, shared=shared), rows, jobs, inputs):
+                for name, data in members:
+                    out.add(name, data)
+        print(f'   comment. wrote {out.count} decks to {"stdout" if archive == "-" else archive}')
+        return
+    if sampleTables:
+        os.makedirs('./Exports', exist_ok=True)
+        for name, table in sampleTables.items():
+            with open(os.path.join('./Exports', name), 'w', newline='') as f:
+                f.write(table)
+    todo = pending = rows
+    if incremental:     # only rebuilds the decks whose inputs (or the generator code) changed since the last run
+        builds = manifest.buildManifest(manifest.manifest_path('./Exports', shard, source))
+        runStamp = manifest.run_stamp(tallydf, settingsdf, resolver, layout, compact, likeFuel, shared)
+        if stream:      # rows are fingerprinted as they stream past, so the count is only known at the end
+            fingerprints, todo = {}, []
+            pending = outdatedRows(rows, builds, runStamp, inventory, fingerprints, todo)
+        else:
+            fingerprints = {row:manifest.row_fingerprint(runStamp, simdf.iloc[row] if cases is None else cases[row], inventory) for row in rows}
+            todo = pending = [row for row in rows if not builds.isCurrent(row, fingerprints[row])]
+            print(f'   comment. {len(rows) - len(todo)} of {len(rows)} decks are up to date')
+    decks = list(mapRows(functools.partial(writeRow, overwrite=incremental, layout=layout, compact=compact, likeFuel=likeFuel, shared=shared), pending, jobs, inputs))
+    if incremental:
+        if stream:
+            print(f'   comment. {len(fingerprints) - len(todo)} of {len(fingerprints)} decks were up to date')
+        for row, deck in zip(todo, decks):
+            builds.record(row, fingerprints[row], deck)
+        builds.retire(fingerprints.keys())
+        for deck in builds.stale:
+            print(f'   comment. stale deck {deck} is no longer produced by any {"Setup row" if cases is None else "case"}')
+        builds.save()
+
+def outdatedRows(rows, builds, runStamp, inventory, fingerprints, todo):
+    '''
+    Passes on the streamed (row, setup row) pairs whose deck is out of date, filling in fingerprints for every row and todo with the rows passed on
+    '''
+    for row, setupRow in rows:
+        fingerprints[row] = manifest.row_fingerprint(runStamp, setupRow, inventory)
+        if not builds.isCurrent(row, fingerprints[row]):
+            todo.append(row)
+            yield row, setupRow
+
+def mapRows(task, rows, jobs, inputs):
+    '''
+    Yields task(row) for every row in row order, from a process pool when there is more than one job and row.
+    rows may also be a stream without a length (e.g. inputloader.stream_setup), which is then only read a few rows ahead of the workers
+    '''
+    global workerInputs
+    sized = hasattr(rows, '__len__')
+    if jobs > 1 and (not sized or len(rows) > 1):
+        filePath, simdf, fueldf, tallydf, settingsdf, inventory, resolver, cases, namers = inputs
+        # the parsed frames are handed to each worker once through the initializer, tasks are only row numbers (or streamed rows)
+        with concurrent.futures.ProcessPoolExecutor(max_workers=jobs, initializer=initWorker, initargs=(filePath, simdf, fueldf, tallydf, settingsdf, resolver, cases, sys.stdout is sys.stderr)) as pool:
+            if sized:
+                yield from pool.map(task, rows, chunksize=max(1, len(rows) // (4*jobs)))
+                return
+            pending = collections.deque()
+            for row in rows:
+                pending.append(pool.submit(task, row))
+                if len(pending) >= 4*jobs:      # enough queued to keep every worker busy, wait on the oldest before reading more
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
+    else:
+        workerInputs = inputs
+        yield from map(task, rows)
+
+workerInputs = None     # (filePath, simdf, fueldf, tallydf, settingsdf, inventory, resolver, cases, namers) inside a pool worker
+
+def initWorker(filePath, simdf, fueldf, tallydf, settingsdf, resolver, cases=None, stdoutToStderr=False):
+    global workerInputs
+    if stdoutToStderr:      # keeps worker prints out of a tar stream on stdout
+        sys.stdout = sys.stderr
+    workerInputs = (filePath, simdf, fueldf, tallydf, settingsdf, fuelgen.fuelInventory(fueldf), resolver, cases, {})  # a pool lasts one run, so do its namers
+
+def buildRow(row, likeFuel=False):
+    '''
+    coreGen for a Setup row, for sweep point row when the run is a sweep, or for a streamed (row, setup row) pair
+    '''
+    filePath, simdf, fueldf, tallydf, settingsdf, inventory, resolver, cases, namers = workerInputs
+    if isinstance(row, tuple):
+        row, setupRow = row
+    else:
+        setupRow = None if cases is None else cases[row]
+    return coreGen(filePath, simdf, fueldf, tallydf, settingsdf, row, inventory, resolver, likeFuel, setupRow)
+
+def writeRow(row, overwrite=False, layout='flat', compact=False, likeFuel=False, shared=False):
+    '''
+    Builds and writes the deck for a single Setup row inside a pool worker, output names only depend on the row so they match a serial run
+    '''
+    return buildRow(row, likeFuel).writeFile(overwrite, layout, compact, shared, workerInputs[-1])
+
+def archiveRow(row, layout='flat', compact=False, likeFuel=False, shared=False):
+    '''
+    Builds the deck for a single Setup row and returns it as [(archive member name, bytes), ...] instead of writing it
+    '''
+    return buildRow(row, likeFuel).getArchiveMembers(layout, compact, shared)
+
+def shardArg(spec):
+    '''
+    argparse type for --shard, so a bad spec is a usage error that keeps parse_shard's message
+    '''
+    try:
+        return genfuncs.parse_shard(spec)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate MCNP decks for every row of the Setup sheet, or every case of a plan file")
+    parser.add_argument("workbook", nargs="?", default="./MCNPCoreGen.xlsx", help="input workbook, or a .json/.toml/.yaml plan file listing the cases (default ./MCNPCoreGen.xlsx)")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="number of worker processes, 0 uses every core (default 1)")
+    parser.add_argument("--shard", type=shardArg, default=None, help="only generate shard K of N of the Setup rows, given as K/N with K counted from 1")
+    parser.add_argument("--xsdir", default=None, help="local xsdir to pick cross-section libraries from instead of the built-in tables")
+    parser.add_argument("--no-cache", action="store_true", help="always re-read the workbook instead of using the sidecar cache")
+    parser.add_argument("--incremental", action="store_true", help="only regenerate decks whose inputs changed since the last run (tracked in Exports/manifest.json), overwriting them in place")
+    parser.add_argument("--layout", choices=genfuncs.EXPORT_LAYOUTS, default="flat", help="'sharded' spreads decks over Exports/core{N}/{hash prefix}/ and lists them in Exports/index.tsv (default flat)")
+    parser.add_argument("--archive", default=None, help="write every deck into one .tar.gz/.tgz/.tar.bz2/.tar.xz/.tar/.zip archive instead of ./Exports, '-' streams a tar to stdout")
+    parser.add_argument("--compact", action="store_true", help="leave out comment padding and banners, only the title and inline $ comments are kept")
+    parser.add_argument("--like-fuel", action="store_true", help="write one full fuel universe and every other element as LIKE n BUT MAT= RHO= U= cards")
+    parser.add_argument("--shared", action="store_true", help="write the blocks every case has in common once to shared_{hash}.inc files pulled in with READ FILE=")
+    parser.add_argument("--sweep", action="append", default=[], metavar="AXIS=VALUES", help=f"generate the cartesian product of every swept axis instead of the Setup rows, values are 'start:stop:step' or 'a,b,c' and the axes are {', '.join(sweeps.AXES)}")
+    parser.add_argument("--base", type=int, default=1, help="Setup row (counted from 1) that gives every column a --sweep or --sample does not vary (default 1)")
+    parser.add_argument("--sample", type=int, default=None, metavar="N", help="generate N cases drawn from the --dist and --mass-dist distributions instead of the Setup rows")
+    parser.add_argument("--method", choices=sweeps.SAMPLE_METHODS, default="lhs", help="how --sample draws its cases, latin hypercube, sobol, or plain random (default lhs)")
+    parser.add_argument("--seed", type=int, default=None, help="seed for --sample, one is drawn and printed when not given")
+    parser.add_argument("--dist", action="append", default=[], metavar="AXIS=DIST", help="distribution of a sampled Setup column, e.g. water_temp=normal:20:2, safe=uniform:0:100, or fuel_temp=triangular:20:300:400")
+    parser.add_argument("--mass-dist", action="append", default=[], metavar="MASS=DIST", help=f"distribution of a relative per element mass, drawn for every element in the core, e.g. u235=normal:1:0.01 (masses are {', '.join(sweeps.MASS_COLUMNS)})")
+    parser.add_argument("--fuel", default=None, help="read the Fuel Info sheet from this .csv/.parquet file instead (same columns as the sheet)")
+    parser.add_argument("--tallies", default=None, help="read the Tallies sheet from this .csv/.parquet file instead")
+    parser.add_argument("--settings", default=None, help="read the Settings sheet from this .csv/.parquet file instead")
+    parser.add_argument("--stream", action="store_true", help="read the Setup sheet one row at a time while writing, for very large sweep workbooks")
+    args = parser.parse_args()
+    sweep = dict(axis.split("=", 1) for axis in args.sweep)
+    sample = {"n": args.sample, "method": args.method, "seed": args.seed,
+              "axes": dict(axis.split("=", 1) for axis in args.dist),
+              "masses": dict(mass.split("=", 1) for mass in args.mass_dist)} if args.sample else None
+    run(args.workbook, cache=not args.no_cache, jobs=args.jobs, shard=args.shard, xsdir=args.xsdir, incremental=args.incremental, layout=args.layout, archive=args.archive, compact=args.compact, likeFuel=args.like_fuel, shared=args.shared,
+        sweep=sweep, base=args.base, sample=sample,
+        tables={sheet:path for sheet, path in (("Fuel Info", args.fuel), ("Tallies", args.tallies), ("Settings", args.settings)) if path}, stream=args.stream)
@@ -0,0 +1,199 @@
+import functools
+import hashlib
+import io
+import os
+import re
+import sys
+import tarfile
+import time
+import zipfile
+
+ENCODING = 'utf-8'
+try:
+    IOV_MAX = os.sysconf('SC_IOV_MAX')     # most buffers a single writev() call accepts
+except (AttributeError, ValueError, OSError):
+    IOV_MAX = 1024
+if IOV_MAX <= 0:
+    IOV_MAX = 1024
+
+@functools.lru_cache(maxsize=None)
+def static(text):
+    '''
+    Encodes a block of text that is the same in every deck (codesnippets geometry, general materials...) once per process.
+    The returned bytes are handed straight to writev for every deck instead of being re-encoded.
+    '''
+    return text.encode(ENCODING)
+
+COMMENT_LINE = re.compile(r'^ {0,4}[cC](?:[ \t][^\n]*)?(?:\n|\Z)', re.M)     # MCNP whole-line comment, a c in columns 1-5 followed by a blank
+
+def compact_deck(deck):
+    '''
+    Copy of a deck without whole-line comments (the make_cs padding, banners, section notes). The title line, the blank lines
+    that end the cell and surface blocks, and inline $ comments are kept, so MCNP reads exactly the same model
+    '''
+    title, newline, body = deck.text().partition('\n')
+    return section([title + newline + COMMENT_LINE.sub('', body)])
+
+INCLUDE_PREFIX = 'shared_'     # shared include files are named shared_{content hash}.inc
+INCLUDE_EXT = '.inc'
+
+def shareable(block):
+    '''
+    Marks a block that does not change across a sweep (it only depends on the particle list, Core Only, ...) by pre-encoding it,
+    split_shared() moves bytes segments into shared include files
+    '''
+    return block.encode(ENCODING) if isinstance(block, str) else block.tobytes()
+
+def is_padding(segment):
+    return isinstance(segment, str) and segment == 'c\n' * (len(segment) // 2)
+
+def split_shared(deck, compact=False, prefix=''):
+    '''
+    Moves every run of shareable (bytes) segments after the title, with the padding between them, into an include file named by the
+    hash of its contents and puts an MCNP READ FILE= card in its place. Decks of a sweep end up referencing the same few includes.
+    prefix is the path from the deck to where the includes are kept (e.g. '../../'). Returns (overlay deck, {include file name: bytes})
+    '''
+    overlay = section(deck[:1])     # the title card has to stay the first line of the deck
+    includes = {}
+    run = []
+    for segment in deck[1:] + [None]:
+        if isinstance(segment, bytes) or (run and is_padding(segment)):
+            run.append(segment)
+            continue
+        data = b''.join(part if isinstance(part, bytes) else part.encode(ENCODING) for part in run)
+        lineStart = not overlay or (overlay[-1].endswith(b'\n') if isinstance(overlay[-1], bytes) else overlay[-1].endswith('\n'))
+        if any(isinstance(part, bytes) for part in run) and data.endswith(b'\n') and lineStart:
+            if compact:
+                data = COMMENT_LINE.sub('', data.decode(ENCODING)).encode(ENCODING)
+            name = f'{INCLUDE_PREFIX}{hashlib.sha256(data).hexdigest()[:16]}{INCLUDE_EXT}'
+            includes[name] = data
+            overlay += f'READ FILE={prefix}{name}\n'
+        else:       # a run that does not start and end on a line boundary is kept in the deck
+            overlay += run
+        run = []
+        if segment is not None:
+            overlay += segment
+    return (compact_deck(overlay) if compact else overlay), includes
+
+class section(list):
+    '''
+    Ordered list of immutable text segments that make up part of (or a whole) deck.
+    `+=` appends a string (or pre-encoded static block) as one segment, or every segment of another section, so sections can be nested
+    into bigger ones (e.g. the fuel cells into the universes) without copying any of their text.
+    '''
+    def __iadd__(self, other):
+        if isinstance(other, (str, bytes)):
+            self.append(other)
+        else:
+            self.extend(other)
+        return self
+
+    def text(self):
+        return ''.join(segment.decode(ENCODING) if isinstance(segment, bytes) else segment for segment in self)
+
+    def buffers(self):
+        '''
+        Segments as bytes, each run of str segments is joined and encoded together, static blocks are passed through as is
+        '''
+        buffers = []
+        run = []
+        for segment in self:
+            if isinstance(segment, bytes):
+                if run:
+                    buffers.append(''.join(run).encode(ENCODING))
+                    run = []
+                buffers.append(segment)
+            else:
+                run.append(segment)
+        if run:
+            buffers.append(''.join(run).encode(ENCODING))
+        return buffers
+
+    def tobytes(self):
+        return b''.join(self.buffers())
+
+    def write(self, f):
+        '''
+        Writes the section to a file opened in binary mode
+        '''
+        buffers = self.buffers()
+        if hasattr(os, 'writev'):
+            f.flush()
+            write_buffers(f.fileno(), buffers)
+        else:       # no writev (e.g. Windows), one buffered call instead
+            f.writelines(buffers)
+
+def write_buffers(fd, buffers):
+    '''
+    Gathers the buffers into fd with os.writev, at most IOV_MAX at a time, and resumes after partial writes
+    '''
+    for start in range(0, len(buffers), IOV_MAX):
+        chunk = [memoryview(buffer) for buffer in buffers[start:start+IOV_MAX] if buffer]
+        first = 0
+        while first < len(chunk):
+            written = os.writev(fd, chunk[first:])
+            while first < len(chunk) and written >= len(chunk[first]):
+                written -= len(chunk[first])
+                first += 1
+            if written:
+                chunk[first] = chunk[first][written:]
+
+ARCHIVE_FORMATS = {'.tar.gz': 'w:gz', '.tgz': 'w:gz', '.tar.bz2': 'w:bz2', '.tar.xz': 'w:xz', '.tar': 'w', '.zip': 'zip'}
+
+class deckArchive():
+    '''
+    Streams decks into a single archive instead of one .i file each. The format follows the extension (see ARCHIVE_FORMATS),
+    '-' writes an uncompressed tar stream to the process's real stdout (even while prints are redirected) so the decks can be piped straight to another host
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.count = 0
+        self.names = set()
+        if path == '-':
+            self.kind = 'tar'
+            self.archive = tarfile.open(fileobj=sys.__stdout__.buffer, mode='w|')
+            return
+        for ext, mode in ARCHIVE_FORMATS.items():
+            if path.lower().endswith(ext):
+                break
+        else:
+            raise ValueError(f"unknown archive type '{path}', expected one of {tuple(ARCHIVE_FORMATS)} or '-'")
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        if mode == 'zip':
+            self.kind = 'zip'
+            self.archive = zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED)
+        else:
+            self.kind = 'tar'
+            self.archive = tarfile.open(path, mode)
+
+    def add(self, name, data):
+        '''
+        Adds one deck (bytes) under the given archive member name, a shared include that is already in the archive is skipped
+        '''
+        if name in self.names:
+            return
+        self.names.add(name)
+        if self.kind == 'zip':
+            info = zipfile.ZipInfo(name, time.localtime()[:6])
+            info.compress_type = zipfile.ZIP_DEFLATED
+            info.external_attr = 0o644 << 16
+            self.archive.writestr(info, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            info.mode = 0o644
+            self.archive.addfile(info, io.BytesIO(data))
+        if name.endswith('.i'):     # shared includes and sample tables ride along but are not decks
+            self.count += 1
+
+    def close(self):
+        self.archive.close()
+        if self.path == '-':
+            sys.__stdout__.buffer.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,7 +1,9 @@
 import re
 import pandas as pd
+import numpy as np
 import gendicts
 import genfuncs
+import xslibs
 from scipy import constants
 
 class fuelGen():
@@ -16,22 +18,49 @@ class fuelGen():
                        add_samarium=True,      # include samarium in model?
                        HZR_Ratio=1.575,        # allows to change the Hydrogen Zirconium Ratio
                        P_imp=None,             # which particles are being traced
-                       matLibs=None):            
+                       matLibs=None,
+                       composition=None,       # precomputed composition of this element from fuelInventory.getComposition()
+                       state=None):            # the row's genfuncs.thermalState, overrides the water/fuel temperature, density, P_imp, and matLibs arguments
         self.data = df_Row
         self.id = self.data['Fuel Element']
         self.loc = self.data[core_configuration_col]
-        self.voidPercent = h2o_void_percent
-        self.h2o_temp_K = h2o_temp_K
-        self.h2o_temp_mev = h2o_temp_mev
-        self.H2ODensity = (1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K)
-        self.uzrh_temp_K = uzrh_temp_K
-        self.uzrh_temp_mev = uzrh_temp_mev
+        self.voidPercent = state.h2o_void_percent if state else h2o_void_percent
+        self.h2o_temp_K = state.h2o_temp_K if state else h2o_temp_K
+        self.h2o_temp_mev = state.h2o_temp_mev if state else h2o_temp_mev
+        self.H2ODensity = state.h2o_density if state else ((1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K))
+        self.uzrh_temp_K = state.uzrh_temp_K if state else uzrh_temp_K
+        self.uzrh_temp_mev = state.uzrh_temp_mev if state else uzrh_temp_mev
         self.add_samarium = add_samarium
         self.HZR_Ratio = HZR_Ratio # TS allows 1.55 to 1.60. This is an ATOM ratio
-        self.P_imp = f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1'         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
+        self.P_imp = state.imp if state else (f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1')         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
+        self.matLibs = state.matLibs if state else matLibs          #material ids for a given fuel temp
+        if composition:     # masses, atom counts, and density already worked out for the whole Fuel Info sheet by fuelInventory
+            self.massGrams = composition['massGrams']
+            self.numAtoms = composition['numAtoms']
+            self.fuelDensity = composition['fuelDensity']
+        else:
+            self.getComposition()
+
+        self.cellCard = f'c\nc --- {self.id} - {self.loc} - ({self.data["Drawing Number"]}) - Universe ---\nc\n'    #cell card
+        self.matCard = 'c\nc\n'    #mat card
+
+        self.zircDensity = 0.0425391        # atoms/barn-cm
+        self.ssDensity = 7.85               # g/cm3
+        self.graphiteDensity = 1.582        # g/cm3
+
+        if not self.matLibs:
+            self.findMatLibs()
+            self.findMtLibs()
+
+        self.getMatCard()
+        self.getCellCard()
+
+    def getComposition(self):
+        '''
+        Works out the isotope masses, atom counts, and fuel meat density of this element on its own (see fuelInventory for the whole sheet at once)
+        '''
         self.massGrams = {'U':self.data['Uranium Now'], 'U235':self.data['U-235 Now'], 'U238':self.data['Uranium Now']-self.data['U-235 Now'], 'PU239':self.data['Pu-239 Now']}     # dictionary of all the different itotopes / elements and their mass in grams
         self.numAtoms = {}  #same thing but it is number of atoms instead of grams
-        self.matLibs = matLibs          #material ids for a given fuel temp
         for mat in self.massGrams.keys():      #get atom numbers for everything in the massGrams
             try:
                 self.numAtoms[mat] = self.massGrams[mat] / gendicts.MOLARS[mat] * constants.Avogadro
@@ -50,65 +79,20 @@ class fuelGen():
 
         self.fuelDensity = (self.massGrams['U'] + self.massGrams['PU239'] + self.massGrams['ZRH'] + (self.massGrams['SM149'] if self.add_samarium else 0))/ 387.7713768
 
-        self.cellCard = f'c\nc --- {self.id} - {self.loc} - ({self.data["Drawing Number"]}) - Universe ---\nc\n'    #cell card
-        self.matCard = 'c\nc\n'    #mat card
-
-        self.zircDensity = 0.0425391        # atoms/barn-cm
-        self.ssDensity = 7.85               # g/cm3
-        self.graphiteDensity = 1.582        # g/cm3
-
-        if not self.matLibs:
-            self.findMatLibs()
-            self.findMtLibs()
-
-        self.getMatCard()
-        self.getCellCard()
-
     def findMatLibs(self):
         '''
         Finds which materials are used for the mat card, accounts for inputted temperature.
+        Uses the closest available temperature from the indexed tables in xslibs.
         '''
+        resolver = xslibs.default_resolver()
         self.matLibs = {'U235':None, 'U238':None, 'PU239':None, 'SM149':None, 'ZR':None, 'H':None, 'O':None, 'ZRH':None, 'HZR':None, 'H2O':None}
-        matList = [[None, gendicts.U235_TEMPS_K_XS_DICT, 'U235'], 
-                    [None, gendicts.U238_TEMPS_K_XS_DICT, 'U238'],
-                    [None, gendicts.PU239_TEMPS_K_XS_DICT, 'PU239'],
-                    [None, gendicts.SM149_TEMPS_K_XS_DICT, 'SM149'],
-                    [None, gendicts.ZR_TEMPS_K_XS_DICT, 'ZR'],
-                    [None, gendicts.H_TEMPS_K_XS_DICT, 'H'], # used in fuel mats, NOT when interpolating h mats
-                    [None, gendicts.O_TEMPS_K_XS_DICT, 'O'],]  # used in light water mat, EVEN WHEN interpolating h mats
-        for elem in matList:
-            try:
-                elem[0] = elem[0][self.uzrh_temp_K]
-            except:
-                closest_temp_K = genfuncs.find_closest_value(self.uzrh_temp_K,list(elem[1].keys()))     #finds closest temperature available material temps
-                elem[0] = elem[1][closest_temp_K]
-                # print(f"\n   comment. {elem[2]} cross-section (xs) data at {self.uzrh_temp_K} K does not exist")
-                # print(f"   comment.   using closest available xs data at temperature: {closest_temp_K} K")
-        for mat in matList:
-            self.matLibs[mat[2]] = mat[0]
+        for mat in xslibs.FUEL_TEMP_LIBS:   # H is used in fuel mats, NOT when interpolating h mats. O is used in light water mat, EVEN WHEN interpolating h mats
+            self.matLibs[mat] = resolver.resolve(mat, self.uzrh_temp_K)
 
     def findMtLibs(self):
-        try:
-            self.matLibs['H2O'] = gendicts.H2O_TEMPS_K_SAB_DICT[self.h2o_temp_K]
-        except:
-            closest_temp_K = genfuncs.find_closest_value(self.h2o_temp_K,list(gendicts.H2O_TEMPS_K_SAB_DICT.keys()))
-            self.matLibs['H2O'] = gendicts.H2O_TEMPS_K_SAB_DICT[closest_temp_K]
-            # print(f"\n   comment. light water scattering S(a,B) data at {self.h2o_temp_K} K does not exist")
-                # print(f"   comment.   using closest available S(a,B) data at temperature: {closest_temp_K} K")
-
-        mt_list = [[None, gendicts.ZR_H_TEMPS_K_SAB_DICT, 'zr_h'],
-                   [None, gendicts.H_ZR_TEMPS_K_SAB_DICT, 'h_zr']]
-
-        for i in range(0,len(mt_list)):
-            try:
-                mt_list[i][0] = mt_list[i][1][self.uzrh_temp_K]
-            except:
-                closest_temp_K = genfuncs.find_closest_value(self.uzrh_temp_K,list(mt_list[i][1].keys()))
-                mt_list[i][0] = mt_list[i][1][closest_temp_K]
-                # print(f"\n   comment. {mt_list[i][2]} scattering S(a,B) data at {self.uzrh_temp_K} does not exist")
-                # print(f"   comment.   using closest available S(a,B) data at temperature: {closest_temp_K} K")
-
-        self.matLibs['ZRH'], self.matLibs['HZR'] = mt_list[0][0], mt_list[1][0]
+        resolver = xslibs.default_resolver()
+        self.matLibs['H2O'] = resolver.resolve('H2O', self.h2o_temp_K)
+        self.matLibs['ZRH'], self.matLibs['HZR'] = resolver.resolve('ZRH', self.uzrh_temp_K), resolver.resolve('HZR', self.uzrh_temp_K)
 
     def getCellCard(self):
         '''
@@ -135,6 +119,35 @@ class fuelGen():
         self.cellCard += f'{self.id}19   102   -{self.H2ODensity}    312308 -312309 -311306           {self.P_imp}   u={self.id}   tmp={self.h2o_temp_mev} $ Water above fuel element\nc\nc'
 
 
+    def getCellMaterials(self):
+        '''
+        (material, density) of each cell getCellCard() writes, keyed by the last two digits of the cell number.
+        Densities are as written on the card, negative is g/cm3 and positive is atoms/barn-cm
+        '''
+        ss = (105, f'-{"{:.2f}".format(self.ssDensity)}')
+        water = (102, f'-{self.H2ODensity}')
+        graphite = (106, f'-{self.graphiteDensity}')
+        zirc = (108, f'{self.zircDensity}')
+        fuel = (self.id, f'-{"{:.6f}".format(self.fuelDensity)}')
+        return {'01':ss, '02':water, '03':ss, '04':water, '05':graphite, '06':ss, '07':zirc, '08':fuel, '09':fuel, '10':fuel,
+                '11':fuel, '12':fuel, '13':graphite, '14':ss, '15':ss, '16':water, '17':ss, '18':water, '19':water}
+
+    def getLikeCellCard(self, ref):
+        '''
+        Same universe as getCellCard() written as LIKE-BUT cards of the reference element's cells. Geometry, importances, and tmp
+        come from the reference, only the universe and the material and density that differ from it are given
+        '''
+        card = f'c\nc --- {self.id} - {self.loc} - ({self.data["Drawing Number"]}) - Universe like {ref.id} ---\nc\n'
+        refMaterials = ref.getCellMaterials()
+        for cell, (mat, rho) in self.getCellMaterials().items():
+            changes = ''
+            if mat != refMaterials[cell][0]:
+                changes += f' MAT={mat}'
+            if mat != refMaterials[cell][0] or rho != refMaterials[cell][1]:
+                changes += f' RHO={rho}'
+            card += f'{self.id}{cell} LIKE {ref.id}{cell} BUT{changes} U={self.id}\n'
+        return card + 'c\nc'
+
     def getMatCard(self):
         '''
         Generates fuel material card for given fuel element, material card is in the form:
@@ -155,21 +168,90 @@ class fuelGen():
         self.matCard += f'mt{self.id} {self.matLibs["HZR"]} {self.matLibs["ZRH"]}\n' # adds Zr materials
         self.matCard += 'c\nc'   # more comment lines after
 
+class fuelInventory():
+    '''
+    Holds the whole Fuel Info sheet as NumPy columns and works out the masses, atom counts, and fuel meat density of every element
+    in one vectorized pass per (H:Zr ratio, Sm) combination. One inventory is shared by every core and Setup row of a run.
+    Temperature does not enter the composition math, only the cross-section libraries, so it is not part of the key.
+    '''
+    def __init__(self, fueldf):
+        self.fueldf = fueldf
+        self.records = fueldf.to_dict('records')    # row dictionaries handed to fuelGen, split off the dataframe only once
+        self.uranium = fueldf['Uranium Now'].to_numpy(dtype=np.float64)
+        self.u235 = fueldf['U-235 Now'].to_numpy(dtype=np.float64)
+        self.pu239 = fueldf['Pu-239 Now'].to_numpy(dtype=np.float64)
+        self.compositions = {}      # (H:Zr ratio, Sm) -> list of per element compositions
+        self.placements = {}        # 'Core N' column -> positions of the elements placed in that core
+
+    def placed(self, core_configuration_col):
+        '''
+        Row positions of the elements that have a position in the given core configuration column
+        '''
+        if core_configuration_col not in self.placements:
+            self.placements[core_configuration_col] = np.flatnonzero(self.fueldf[core_configuration_col].notna().to_numpy()).tolist()
+        return self.placements[core_configuration_col]
+
+    def getComposition(self, HZR_Ratio=1.575, add_samarium=True):
+        '''
+        Per element compositions (same layout fuelGen.getComposition() fills in) for every row of the sheet, computed once per combination
+        '''
+        key = (float(HZR_Ratio), bool(add_samarium))
+        if key not in self.compositions:
+            self.compositions[key] = self.compose(HZR_Ratio, add_samarium)
+        return self.compositions[key]
+
+    def compose(self, HZR_Ratio, add_samarium):
+        # same operations in the same order as fuelGen.getComposition() so the cards come out identical
+        massGrams = {'U':self.uranium, 'U235':self.u235, 'U238':self.uranium-self.u235, 'PU239':self.pu239}
+        numAtoms = {mat:massGrams[mat] / gendicts.MOLARS[mat] * constants.Avogadro for mat in massGrams.keys() if mat in gendicts.MOLARS}
+        if add_samarium:
+            numAtoms['SM149'] = numAtoms['U235'] / 6880 # from Eq. 3 in U.S. Patent 2843539 
+            massGrams['SM149'] = numAtoms['SM149'] * gendicts.MOLARS['SM149'] / constants.Avogadro
+        massGrams['ZRH'] = (massGrams['U'] + massGrams['PU239']) / 8.5 * (100-8.5)
+        numAtoms['ZR'] = massGrams['ZRH']/(gendicts.MOLARS['ZR']/constants.Avogadro + HZR_Ratio*gendicts.MOLARS['H']/constants.Avogadro)
+        numAtoms['H'] = HZR_Ratio * numAtoms['ZR']
+        massGrams['ZR'] = numAtoms['ZR'] * gendicts.MOLARS['ZR'] / constants.Avogadro
+        massGrams['H'] = numAtoms['H'] * gendicts.MOLARS['H'] / constants.Avogadro
+        fuelDensity = (massGrams['U'] + massGrams['PU239'] + massGrams['ZRH'] + (massGrams['SM149'] if add_samarium else 0))/ 387.7713768
+
+        massRows = zip(*(massGrams[mat].tolist() for mat in massGrams.keys()))      # splits the columns back into one small dict per element
+        atomRows = zip(*(numAtoms[mat].tolist() for mat in numAtoms.keys()))
+        return [{'massGrams':dict(zip(massGrams.keys(), masses)), 'numAtoms':dict(zip(numAtoms.keys(), atoms)), 'fuelDensity':density}
+                for masses, atoms, density in zip(massRows, atomRows, fuelDensity.tolist())]
+
+FUEL_CACHE = genfuncs.lruCache(maxSize=1024)     # rendered fuelGen objects shared by every row in this process
+FUEL_CACHE_COLUMNS = ('Fuel Element', 'Drawing Number', 'Uranium Now', 'U-235 Now', 'Pu-239 Now')     # the Fuel Info columns fuelGen reads
+
+def cachedFuelGen(core_configuration_col, df_Row, h2o_temp_K=294, h2o_temp_mev=2.533494e-08, h2o_density=None, h2o_void_percent=0,
+                  uzrh_temp_K=294, uzrh_temp_mev=2.533494e-08, add_samarium=True, HZR_Ratio=1.575, P_imp=None, matLibs=None, composition=None, state=None):
+    '''
+    Same arguments as fuelGen(), but returns an already built element when every input that reaches its cards matches an earlier call.
+    In a rod height sweep this means the atom math, mat card, and cell card of each element are only done once.
+    '''
+    key = (tuple(None if pd.isnull(df_Row[col]) else df_Row[col] for col in (core_configuration_col,) + FUEL_CACHE_COLUMNS),
+           h2o_temp_K, h2o_temp_mev, h2o_density, h2o_void_percent, uzrh_temp_K, uzrh_temp_mev, add_samarium, HZR_Ratio,
+           tuple(P_imp) if P_imp else None,
+           tuple(matLibs.items()) if matLibs else None,
+           state.key() if state else None)
+    return FUEL_CACHE.getOrMake(key, lambda: fuelGen(core_configuration_col, df_Row, h2o_temp_K, h2o_temp_mev, h2o_density, h2o_void_percent,
+                                                     uzrh_temp_K, uzrh_temp_mev, add_samarium, HZR_Ratio, P_imp, matLibs, composition, state))
+
 class graphiteGen():
     def __init__(self, h2o_density = None,
                        h2o_temp_k = 294, 
                        h2o_temp_mev = 2.533494e-08,
                        h2o_void_percent = 0,
-                       P_imp = None):
-        self.voidPercent = h2o_void_percent
-        self.h2o_temp_K = h2o_temp_k
-        self.H2ODensity = (1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K)
-        self.P_imp = f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1'         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
+                       P_imp = None,
+                       state = None):
+        self.voidPercent = state.h2o_void_percent if state else h2o_void_percent
+        self.h2o_temp_K = state.h2o_temp_K if state else h2o_temp_k
+        self.H2ODensity = state.h2o_density if state else ((1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K))
+        self.P_imp = state.imp if state else (f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1')         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
 
         self.ssDensity = 2.70
         self.graphiteDensity = 1.698
 
-        self.tmp = h2o_temp_mev
+        self.tmp = state.h2o_temp_mev if state else h2o_temp_mev
 
         self.cellCard = ''
 
@@ -196,12 +278,13 @@ class sourceGen():
                        h2o_void_percent = 0,
                        AmBe_loc = None,
                        Ir_loc = None,
-                       P_imp = None):
+                       P_imp = None,
+                       state = None):
         
-        self.voidPercent = h2o_void_percent
-        self.h2o_temp_K = h2o_temp_k
-        self.H2ODensity = (1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K)
-        self.P_imp = f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1'         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
+        self.voidPercent = state.h2o_void_percent if state else h2o_void_percent
+        self.h2o_temp_K = state.h2o_temp_K if state else h2o_temp_k
+        self.H2ODensity = state.h2o_density if state else ((1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K))
+        self.P_imp = state.imp if state else (f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1')         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
 
         self.AmBe_loc = AmBe_loc
         self.Ir_loc = Ir_loc
@@ -209,7 +292,7 @@ class sourceGen():
         self.alDensity = 2.70
         self.airDensity = 0.0012922
 
-        self.tmp = h2o_temp_mev
+        self.tmp = state.h2o_temp_mev if state else h2o_temp_mev
 
         self.AmBe = ''
         self.Ir = ''
@@ -112,4 +112,84 @@ TALLY_CELLS = {'Safe': 30507,
                'Linear': 70001,
                'Percent': 70002,
                'Log': 70003,
-               'Empty Channel': 70004}
\ No newline at end of file
+               'Empty Channel': 70004}
+
+# column ranges read from each sheet of the input workbook
+WORKBOOK_USECOLS = {'Setup': 'A:R',
+                    'Fuel Info': 'A:Y',
+                    'Tallies': 'A:G',
+                    'Settings': 'B:F'}
+
+# explicit column dtypes for each sheet so pandas never has to guess, columns not listed fall back to WORKBOOK_DEFAULT_DTYPES
+SETUP_DTYPES = {'Sim Number': 'float64',
+                'Add Sm': 'str',
+                'Water Temperature (C)': 'float64',
+                'Fuel Temperature (C)': 'float64',
+                'Core Number': 'float64',
+                'H:Zr Ratio': 'float64',
+                'H2O Density': 'float64',
+                'H2O Void Percent': 'float64',
+                'H2O Pressure (MPa)': 'float64',     # optional, only set by plans and sweeps (the workbook's Setup columns end at R)
+                'Graphite Core Pos': 'str',
+                'AmBe Core Pos': 'str',
+                'Ir Core Pos': 'str',
+                'Shim Rod': 'float64',
+                'Safe Rod': 'float64',
+                'Reg Rod': 'float64',
+                'Particle Transports': 'str',
+                'Beam Open': 'str',
+                'Rabbit in Core': 'str',
+                'Scale': 'str'}
+
+FUEL_DTYPES = {'Fuel Element': 'int64',
+               'Drawing Number': 'str',
+               'Date Received': 'datetime64[ns]',
+               'Uranium New': 'float64',
+               'U-235 New': 'float64',
+               'FE Fract.': 'float64',
+               'Uranium Received': 'float64',
+               'U-235 Received': 'float64',
+               'Pu-239 Received': 'float64',
+               'MW-Day Received': 'float64',
+               'MW-Hr on FE': 'float64',
+               'U-235 Used': 'float64',
+               'Pu-239 Made': 'float64',
+               'Pu-239 Now': 'float64',
+               'Uranium Now': 'float64',
+               'U-235 Now': 'float64',
+               'Uranium in Core': 'float64',
+               'U-235 in Core': 'float64',
+               'Uranium Out Core': 'float64',
+               'U-235 Out Core': 'float64'}     # every 'Core N' layout column is read as str
+
+TALLY_DTYPES = {'Tally Number': 'float64',
+                'Power (W)': 'float64',
+                'Tally Area': 'str',
+                'Lazy Susan Positions': 'str',
+                'Energy Bins': 'str',
+                'Energy Comments': 'str',
+                'Particles': 'str'}
+
+SETTINGS_DTYPES = {'Fission Neutrons/Fission': 'float64',
+                   'Fissions/MeV': 'float64',
+                   'Mev/J': 'float64',
+                   'Custom Energy Bins:': 'float64'}
+
+WORKBOOK_DTYPES = {'Setup': SETUP_DTYPES,
+                   'Fuel Info': FUEL_DTYPES,
+                   'Tallies': TALLY_DTYPES,
+                   'Settings': SETTINGS_DTYPES}
+
+WORKBOOK_DEFAULT_DTYPES = {'Setup': 'str',
+                           'Fuel Info': 'str',
+                           'Tallies': 'str',
+                           'Settings': 'float64'}
+
+# columns the generators read from each sheet, a CSV/Parquet table standing in for a sheet has to carry at least these (the Fuel Info
+# table also needs a 'Core N' column for every core it is used with)
+REQUIRED_COLUMNS = {'Setup': ('Add Sm', 'Water Temperature (C)', 'Fuel Temperature (C)', 'Core Number', 'H:Zr Ratio', 'H2O Density', 'H2O Void Percent',
+                              'Graphite Core Pos', 'AmBe Core Pos', 'Ir Core Pos', 'Shim Rod', 'Safe Rod', 'Reg Rod', 'Particle Transports',
+                              'Beam Open', 'Rabbit in Core', 'Scale'),
+                    'Fuel Info': ('Fuel Element', 'Drawing Number', 'Pu-239 Now', 'Uranium Now', 'U-235 Now'),
+                    'Tallies': ('Power (W)', 'Tally Area', 'Lazy Susan Positions', 'Energy Bins', 'Particles'),
+                    'Settings': ('Fission Neutrons/Fission', 'Fissions/MeV', 'Mev/J', 'Custom Energy Bins:')}
@@ -1,45 +1,174 @@
 import os
+import collections
+import functools
+import hashlib
+import typing
+import waterprops
 
 def find_closest_value(K, lst):
     return lst[min(range(len(lst)), key=lambda i: abs(lst[i] - K))]
 
-def find_h2o_temp_K_density(K):
+def find_h2o_temp_K_density(K, pressure_MPa=None):
+    '''
+    Water density (g/cc) at K, at 1 atm from waterprops' 0.01 C table or at pressure_MPa from its IAPWS-IF97 table
+    (pass an array to waterprops.h2o_density for many at once)
+    '''
     try:
-        C = float('{:.2f}'.format(float(K)-273.15))
-        density = float('{:.6f}'.format((
-            999.83952
-            +16.945176*C
-            -7.9870401e-3*C**2
-            -46.170461e-6*C**3
-            +105.56302e-9*C**4
-            -280.54253e-12*C**5)/(1+16.897850e-3*C)/1000))
-        # print(f"\n   comment. at {C} C, h2o density was calculated to be {density} g/cc ")
-        # Equation for water density given temperature in C, works for 0 to 150 C at 1 atm
-        # https://www.ncbi.nlm.nih.gov/pmc/articles/PMC4909168/
-
-        if C < 0 or C > 150: 
-            print(f"\n   warning. h2o has calculated density {density} g/cc at given temp {C} C")
-            print(f"   warning. but that is outside the range 0 - 150 C safely predicted by the formula ")
-        return density
-
+        return waterprops.h2o_density(float(K), None if pressure_MPa is None else float(pressure_MPa))
     except:
         print(f"\n   fatal. finding h2o density for temperature {K} K failed")
         print(f"   fatal. ensure you are inputing a numeric-only str, float, or int into the function")
 
-def find_available_name(name):
+class outputNamer():
     '''
-    Finds first available file path
+    Hands out collision free output names in one directory. The directory is listed once, after that each name is a set lookup,
+    and names are claimed with O_CREAT|O_EXCL so concurrent writers (pool workers, other nodes) can never end up with the same file.
+    Picks the first free name out of base, base_1, base_2, ... Make one per run, the listing is not refreshed when files are removed.
     '''
-    fileNo = 1
-    while True:
-        testName = f'{name}_{fileNo}'
-        if not os.path.exists(f'{testName}.i'):
-            return testName
-        else:
+    def __init__(self, dirPath, ext='.i'):
+        self.dirPath = dirPath
+        self.ext = ext
+        self.taken = {name for name in os.listdir(dirPath) if name.endswith(ext)} if os.path.isdir(dirPath) else set()
+        self.nextNo = {}    # base name -> lowest suffix that can still be free (0 is the bare base name)
+
+    def candidates(self, base):
+        fileNo = self.nextNo.get(base, 0)
+        while True:
+            name = base if fileNo == 0 else f'{base}_{fileNo}'
+            if f'{name}{self.ext}' not in self.taken:
+                yield fileNo, name
             fileNo += 1
 
+    def claim(self, base):
+        '''
+        Atomically creates the first free file, returns (path without the extension, file opened for binary writing)
+        '''
+        for fileNo, name in self.candidates(base):
+            self.taken.add(f'{name}{self.ext}')
+            try:
+                fd = os.open(os.path.join(self.dirPath, f'{name}{self.ext}'), os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, 'O_BINARY', 0), 0o666)
+            except FileExistsError:     # another writer got there first, try the next suffix
+                continue
+            self.nextNo[base] = fileNo + 1
+            return os.path.join(self.dirPath, name), os.fdopen(fd, 'wb')
+
+EXPORT_LAYOUTS = ('flat', 'sharded')
+EXPORT_INDEX = 'index.tsv'      # name<TAB>path (relative to the export root) of every deck written with the sharded layout, later lines win
+
+def export_dir(rootPath, coreNo, name, layout='flat'):
+    '''
+    Directory a deck goes in. 'flat' puts every deck in rootPath, 'sharded' fans out into rootPath/core{N}/{2 hex chars of the name's hash}
+    so no directory ends up holding more than a few hundred decks. _1, _2, ... copies of a name land next to it.
+    '''
+    if layout == 'flat':
+        return rootPath
+    if layout == 'sharded':
+        return os.path.join(rootPath, f'core{coreNo}', hashlib.sha1(name.encode()).hexdigest()[:2])
+    raise ValueError(f"unknown export layout '{layout}', expected one of {EXPORT_LAYOUTS}")
+
+def include_prefix(layout='flat'):
+    '''
+    Path from a deck's directory back to the export root, where the shared include files of every layout sit ('' for flat, '../../' for sharded)
+    '''
+    return '../' * len([part for part in export_dir('', 0, '', layout).split(os.sep) if part])
+
+def append_index(rootPath, name, filePath):
+    '''
+    Records a written deck in the export index. One O_APPEND write per line, so parallel writers never interleave entries
+    '''
+    line = f'{name}\t{os.path.relpath(filePath, rootPath)}\n'.encode()
+    fd = os.open(os.path.join(rootPath, EXPORT_INDEX), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o666)
+    try:
+        os.write(fd, line)
+    finally:
+        os.close(fd)
+
+@functools.lru_cache(maxsize=None)     # the same few padding blocks are reused by every section of every deck
 def make_cs(num):
     return 'c\n' * num
 
 def k_to_mev(k):
-    return 1.380649/1.602176634*10**-10*k
\ No newline at end of file
+    return 1.380649/1.602176634*10**-10*k
+
+def parse_shard(spec):
+    '''
+    Parses a shard spec such as "3/16" (or a (3, 16) tuple) into (shard number, shard count), shard numbers start at 1
+    '''
+    try:
+        shardNo, shardCount = (int(part) for part in (spec.split('/') if isinstance(spec, str) else spec))
+    except (TypeError, ValueError):
+        raise ValueError(f"shard spec '{spec}' should look like K/N, e.g. 3/16")
+    if shardCount < 1 or not 1 <= shardNo <= shardCount:
+        raise ValueError(f"shard spec '{spec}' is out of range, K must be between 1 and N")
+    return shardNo, shardCount
+
+
+class thermalState(typing.NamedTuple):
+    '''
+    Water and fuel conditions of one Setup row, worked out once (see thermal_state()) and handed to every generator through its
+    state argument, so every component writes the exact same density, temperatures, importances, and libraries
+    '''
+    h2o_temp_K: float
+    h2o_temp_mev: str           # tmp= value written on the water cells
+    h2o_density: float          # g/cc with the void fraction already applied
+    h2o_void_percent: float
+    uzrh_temp_K: float
+    uzrh_temp_mev: str          # tmp= value written on the fuel cells
+    imp: str                    # importance card text, e.g. 'imp:n,p=1'
+    matLibs: dict
+
+    def key(self):
+        '''
+        Hashable copy for cache keys
+        '''
+        return self._replace(matLibs=tuple(self.matLibs.items()) if self.matLibs else None)
+
+    def waterKey(self):
+        '''
+        Hashable copy of only the water conditions and importance, for the cache keys of components that never read the fuel fields or libraries
+        '''
+        return (self.h2o_temp_K, self.h2o_temp_mev, self.h2o_density, self.h2o_void_percent, self.imp)
+
+def thermal_state(h2o_temp_K, h2o_temp_mev, uzrh_temp_K, uzrh_temp_mev, h2o_density=None, h2o_void_percent=0, P_imp=None, matLibs=None, h2o_pressure_MPa=None):
+    '''
+    Builds a row's thermalState. The void fraction is applied exactly once, to the given density or the one calculated from the water temperature
+    (and pressure, 1 atm when it is None)
+    '''
+    return thermalState(h2o_temp_K=h2o_temp_K,
+                        h2o_temp_mev=h2o_temp_mev,
+                        h2o_density=(1-0.01*h2o_void_percent) * (h2o_density if h2o_density else find_h2o_temp_K_density(h2o_temp_K, h2o_pressure_MPa)),
+                        h2o_void_percent=h2o_void_percent,
+                        uzrh_temp_K=uzrh_temp_K,
+                        uzrh_temp_mev=uzrh_temp_mev,
+                        imp=f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1',
+                        matLibs=matLibs)
+
+class lruCache():
+    '''
+    Bounded least-recently-used cache shared by everything in a process that renders the same cards for many rows
+    '''
+    def __init__(self, maxSize=1024):
+        self.maxSize = maxSize
+        self.entries = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def getOrMake(self, key, make):
+        '''
+        Returns the cached value for key, calling make() to build (and store) it on a miss
+        '''
+        try:
+            value = self.entries[key]
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+        except KeyError:
+            self.misses += 1
+        value = make()
+        self.entries[key] = value
+        if len(self.entries) > self.maxSize:
+            self.entries.popitem(last=False)    # evicts the least recently used entry
+        return value
+
+    def clear(self):
+        self.entries.clear()
@@ -0,0 +1,184 @@
+import collections
+import hashlib
+import os
+import pickle
+import numpy as np
+import pandas as pd
+import openpyxl
+import gendicts
+
+CACHE_SUFFIX = '.cache'         # sidecar cache is written next to the workbook as '<workbook>.xlsx.cache'
+DROPNA_COLUMNS = {'Setup': 'Core Number', 'Fuel Info': 'Fuel Element', 'Tallies': 'Power (W)'}     # rows missing this value are empty rows and are dropped
+TABLE_FORMATS = {'.csv': 'csv', '.parquet': 'parquet', '.pq': 'parquet'}
+NA_STRINGS = {'', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan', '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None',
+              'n/a', 'nan', 'null'}    # text pandas reads as a missing value by default, stream_setup() follows it
+
+def load_workbook(filePath, setup=True):
+    '''
+    Opens the input workbook once and reads the Setup, Fuel Info, Tallies, and Settings sheets from it in a single pass.
+    Every column is given an explicit dtype (see gendicts.WORKBOOK_DTYPES) so pandas does not have to infer column types.
+    Returns the four frames in the order (simdf, fueldf, tallydf, settingsdf), simdf is left empty when setup is False (see stream_setup)
+    '''
+    frames = {'Setup': empty_setup()}
+    with pd.ExcelFile(filePath, engine="openpyxl") as workbook:     # the xlsx is unzipped and loaded only once for all four sheets
+        for sheet in gendicts.WORKBOOK_USECOLS.keys():
+            if sheet == 'Setup' and not setup:
+                continue
+            frames[sheet] = workbook.parse(sheet,
+                                           usecols=gendicts.WORKBOOK_USECOLS[sheet],
+                                           dtype=collections.defaultdict(lambda sheet=sheet: gendicts.WORKBOOK_DEFAULT_DTYPES[sheet], read_dtypes(sheet)))
+    for sheet, column in DROPNA_COLUMNS.items():
+        frames[sheet].dropna(subset=column, inplace=True)     # removes rows that contain empty values
+        frames[sheet] = cast_ints(frames[sheet], sheet)
+    return frames['Setup'], frames['Fuel Info'], frames['Tallies'], frames['Settings']
+
+def read_dtypes(sheet):
+    '''
+    The sheet's dtypes with int64 columns read as float64, so blank trailing rows (e.g. formatted but empty) can be read and dropped
+    before cast_ints() turns them back into int64
+    '''
+    return {col:'float64' if dtype == 'int64' else dtype for col, dtype in gendicts.WORKBOOK_DTYPES[sheet].items()}
+
+def cast_ints(frame, sheet):
+    return frame.astype({col:dtype for col, dtype in gendicts.WORKBOOK_DTYPES[sheet].items() if dtype == 'int64' and col in frame.columns})
+
+def load_table(filePath, sheet):
+    '''
+    Reads one sheet's worth of input from a CSV or Parquet file (e.g. the nightly fuel database export) instead of the workbook.
+    Columns get the same dtypes load_workbook() gives them (see gendicts.WORKBOOK_DTYPES), so the frame is interchangeable with the sheet's.
+    Parquet needs pyarrow or fastparquet
+    '''
+    dtypes = read_dtypes(sheet)
+    default = gendicts.WORKBOOK_DEFAULT_DTYPES[sheet]
+    fmt = TABLE_FORMATS.get(os.path.splitext(filePath)[1].lower())
+    if fmt == 'csv':
+        columns = pd.read_csv(filePath, nrows=0).columns        # header only, to give every column its dtype up front
+        dates = [col for col in columns if dtypes.get(col, default).startswith('datetime')]
+        frame = pd.read_csv(filePath, dtype={col:dtypes.get(col, default) for col in columns if col not in dates}, parse_dates=dates,
+                            float_precision='round_trip')     # masses come back bit for bit as they were exported
+        frame = frame.astype({col:dtypes.get(col, default) for col in dates})
+    elif fmt == 'parquet':
+        try:
+            frame = pd.read_parquet(filePath)
+        except ImportError as e:
+            raise ImportError(f"reading '{filePath}' needs pyarrow or fastparquet ({e})") from e
+        frame = frame.astype({col:dtypes.get(col, default) for col in frame.columns if str(frame[col].dtype) != dtypes.get(col, default)})     # parquet keeps its own types, only mismatches are cast
+    else:
+        raise ValueError(f"'{filePath}' is not a .csv or .parquet file")
+    missing = [col for col in gendicts.REQUIRED_COLUMNS[sheet] if col not in frame.columns]
+    if missing:
+        raise ValueError(f"'{filePath}' can not stand in for the {sheet} sheet, it has no {', '.join(missing)} column{'s' if len(missing) > 1 else ''}")
+    if sheet in DROPNA_COLUMNS:
+        frame.dropna(subset=DROPNA_COLUMNS[sheet], inplace=True)      # removes rows that contain empty values
+    return cast_ints(frame, sheet)
+
+def load_inputs(filePath=None, tables=None, cache=True, setup=True):
+    '''
+    (simdf, fueldf, tallydf, settingsdf) from the workbook at filePath, with every sheet named in tables ({sheet: CSV/Parquet path}) read
+    from that file instead. Without a workbook, or when setup is False, the Setup frame is empty.
+    Without a workbook every other sheet has to come from a table
+    '''
+    tables = tables if tables else {}
+    if filePath and not setup:      # the Setup sheet is streamed instead, the sidecar cache would hold all of it so it is not used
+        frames = dict(zip(gendicts.WORKBOOK_USECOLS.keys(), load_workbook(filePath, setup=False)))
+    elif filePath:
+        frames = dict(zip(gendicts.WORKBOOK_USECOLS.keys(), load_workbook_cached(filePath) if cache else load_workbook(filePath)))
+    else:
+        missing = [sheet for sheet in gendicts.WORKBOOK_USECOLS.keys() if sheet != 'Setup' and sheet not in tables]
+        if missing:
+            raise ValueError(f"no workbook given, so the {', '.join(missing)} input{'s' if len(missing) > 1 else ''} must come from CSV/Parquet tables")
+        frames = {'Setup': empty_setup()}
+    for sheet, tablePath in tables.items():
+        frames[sheet] = load_table(tablePath, sheet)
+    return frames['Setup'], frames['Fuel Info'], frames['Tallies'], frames['Settings']
+
+def load_workbook_cached(filePath):
+    '''
+    Same as load_workbook() but keeps the parsed frames in a pickled sidecar file keyed by the workbook's content hash and mtime.
+    A warm run with an unchanged workbook never touches openpyxl. A touched but unchanged workbook is re-hashed and the cache re-stamped.
+    '''
+    cachePath = filePath + CACHE_SUFFIX
+    stat = os.stat(filePath)
+    schema = loader_schema()
+    cached = read_cache(cachePath)
+    if cached and cached['schema'] == schema:
+        if cached['mtime'] == stat.st_mtime_ns and cached['size'] == stat.st_size:     # fast path, nothing has touched the workbook
+            return cached['frames']
+        digest = file_hash(filePath)
+        if cached['hash'] == digest:        # workbook was saved/touched but its contents did not change
+            write_cache(cachePath, schema, digest, stat, cached['frames'])
+            return cached['frames']
+    else:
+        digest = file_hash(filePath)
+    frames = load_workbook(filePath)
+    write_cache(cachePath, schema, digest, stat, frames)
+    return frames
+
+def loader_schema():
+    '''
+    Fingerprint of the sheet layout and dtypes, so caches written by an older loader are never reused
+    '''
+    return hashlib.sha256(repr((gendicts.WORKBOOK_USECOLS, gendicts.WORKBOOK_DTYPES, gendicts.WORKBOOK_DEFAULT_DTYPES, pd.__version__)).encode()).hexdigest()
+
+def file_hash(filePath):
+    sha = hashlib.sha256()
+    with open(filePath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+def read_cache(cachePath):
+    try:
+        with open(cachePath, 'rb') as f:
+            return pickle.load(f)
+    except Exception:       # a missing, truncated, or incompatible cache is just a cache miss
+        return None
+
+def write_cache(cachePath, schema, digest, stat, frames):
+    tmpPath = f'{cachePath}.{os.getpid()}.tmp'
+    try:
+        with open(tmpPath, 'wb') as f:
+            pickle.dump({'schema': schema, 'hash': digest, 'mtime': stat.st_mtime_ns, 'size': stat.st_size, 'frames': frames}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmpPath, cachePath)     # atomic swap so concurrent runs never read a half written cache
+    except OSError as e:
+        print(f"   warning. could not write input cache '{cachePath}' ({e})")
+        if os.path.exists(tmpPath):
+            os.remove(tmpPath)
+
+def empty_setup():
+    return pd.DataFrame({col:pd.Series(dtype=dtype) for col, dtype in gendicts.SETUP_DTYPES.items()})
+
+def stream_setup(filePath):
+    '''
+    Yields (row, Setup row as a Series) for every row of the Setup sheet, reading the sheet with openpyxl's read-only mode so only the
+    current row is ever in memory. Rows without a Core Number are skipped, rows are numbered and their values typed the same way
+    load_workbook() does, so row n here is simdf.iloc[n] there
+    '''
+    workbook = openpyxl.load_workbook(filePath, read_only=True, data_only=True, keep_links=False)
+    try:
+        first, last = gendicts.WORKBOOK_USECOLS['Setup'].split(':')
+        cells = workbook['Setup'].iter_rows(min_col=openpyxl.utils.column_index_from_string(first),
+                                            max_col=openpyxl.utils.column_index_from_string(last), values_only=True)
+        header = next(cells, ())
+        columns = [name if name is not None else f'Unnamed: {i}' for i, name in enumerate(header)]
+        dtypes = [gendicts.SETUP_DTYPES.get(col, gendicts.WORKBOOK_DEFAULT_DTYPES['Setup']) for col in columns]
+        row = 0
+        for values in cells:
+            values = values + (None,) * (len(columns) - len(values))    # read-only rows stop at their last filled cell
+            setupRow = pd.Series({col:cell_value(value, dtype) for col, value, dtype in zip(columns, values, dtypes)})
+            if pd.isnull(setupRow[DROPNA_COLUMNS['Setup']]):    # removes rows that contain empty values
+                continue
+            yield row, setupRow
+            row += 1
+    finally:
+        workbook.close()
+
+def cell_value(value, dtype):
+    '''
+    A raw openpyxl cell value converted the way pandas.read_excel converts it for a column of the given dtype
+    '''
+    if value is None or (isinstance(value, str) and value in NA_STRINGS):
+        return np.nan
+    if isinstance(value, float) and value.is_integer():     # pandas reads whole numbers as int, so a str column gets '5' and not '5.0'
+        value = int(value)
+    return float(value) if dtype == 'float64' else str(value) if dtype == 'str' else value
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import os
+import genfuncs
+
+MANIFEST_VERSION = 1
+CODE_STAMP = None
+
+def code_stamp():
+    '''
+    Hash of every generator module's source, so changing the code invalidates every deck. Computed once per process
+    '''
+    global CODE_STAMP
+    if CODE_STAMP is None:
+        sha = hashlib.sha256()
+        codeDir = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(codeDir)):
+            if name.endswith('.py'):
+                with open(os.path.join(codeDir, name), 'rb') as f:
+                    sha.update(name.encode() + b'\0' + f.read() + b'\0')
+        CODE_STAMP = sha.hexdigest()
+    return CODE_STAMP
+
+def run_stamp(tallydf, settingsdf, resolver, *options):
+    '''
+    Hash of the inputs every row of a run shares: code, Tallies and Settings sheets, the cross-section tables in use,
+    and any output options that change the deck text or where it is written (e.g. compact, layout)
+    '''
+    sha = hashlib.sha256()
+    sha.update(code_stamp().encode())
+    sha.update(tallydf.to_csv().encode())
+    sha.update(settingsdf.to_csv().encode())
+    sha.update(repr(sorted(resolver.index.items())).encode())
+    sha.update(repr(options).encode())
+    return sha.hexdigest()
+
+def row_fingerprint(runStamp, setup, inventory):
+    '''
+    Hash of everything a Setup row's deck is built from: the row itself (or sweep point), the Fuel Info rows placed in its core, and the run stamp
+    '''
+    coreCol = f"Core {int(setup['Core Number'])}"
+    sha = hashlib.sha256()
+    sha.update(runStamp.encode())
+    sha.update(repr(sorted(setup.to_dict().items())).encode())
+    for item in inventory.placed(coreCol):
+        sha.update(repr(sorted(inventory.records[item].items())).encode())
+    return sha.hexdigest()
+
+def manifest_path(dirPath='./Exports', shard=None, source=None):
+    '''
+    Every shard keeps its own manifest so nodes writing to a shared Exports folder never rewrite each other's, and so does every case
+    source (e.g. 'sweep' or 'plan-<name>', None for the Setup rows) since their row numbers count different cases
+    '''
+    name = 'manifest' if source is None else f'manifest_{source}'
+    if shard:
+        shardNo, shardCount = genfuncs.parse_shard(shard)
+        return os.path.join(dirPath, f'{name}_{shardNo}of{shardCount}.json')
+    return os.path.join(dirPath, f'{name}.json')
+
+class buildManifest():
+    '''
+    Maps each Setup row to the fingerprint of its inputs and the deck it produced, saved as json next to the decks
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.decks = {}     # str(row) -> {"fingerprint": ..., "deck": ...}
+        self.stale = []     # decks that no Setup row produces anymore
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+            if saved.get("version") == MANIFEST_VERSION:
+                self.decks = saved["decks"]
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            print(f"   warning. could not read manifest '{path}' ({e}), regenerating every deck")
+
+    def isCurrent(self, row, fingerprint):
+        entry = self.decks.get(str(row))
+        return entry is not None and entry["fingerprint"] == fingerprint and os.path.exists(entry["deck"])
+
+    def record(self, row, fingerprint, deck):
+        entry = self.decks.get(str(row))
+        if entry is not None and entry["deck"] != deck:     # e.g. a rod height changed, so the row's deck has a new name
+            self.stale.append(entry["deck"])
+        self.decks[str(row)] = {"fingerprint": fingerprint, "deck": deck}
+
+    def retire(self, rows):
+        '''
+        Drops the entries of rows that are no longer in the Setup sheet, their decks are reported as stale
+        '''
+        keep = {str(row) for row in rows}
+        for key in [key for key in self.decks if key not in keep]:
+            self.stale.append(self.decks.pop(key)["deck"])
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmpPath = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmpPath, 'w') as f:
+            json.dump({"version": MANIFEST_VERSION, "decks": self.decks}, f, indent=1, sort_keys=True)
+        os.replace(tmpPath, self.path)      # atomic swap so an interrupted run never leaves a half written manifest
@@ -65,15 +65,16 @@ class waterGen():
                        h2o_void_percent = 0,
                        P_imp = None,
                        matLibs = None,
-                       coreOnly = True):
+                       coreOnly = True,
+                       state = None):
 
-        self.voidPercent = h2o_void_percent
-        self.h2o_temp_K = h2o_temp_k
-        self.H2ODensity = (1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K)
-        self.P_imp = f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1'         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
-        self.tmp = h2o_temp_mev
+        self.voidPercent = state.h2o_void_percent if state else h2o_void_percent
+        self.h2o_temp_K = state.h2o_temp_K if state else h2o_temp_k
+        self.H2ODensity = state.h2o_density if state else ((1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K))
+        self.P_imp = state.imp if state else (f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1')         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
+        self.tmp = state.h2o_temp_mev if state else h2o_temp_mev
 
-        self.matLibs = matLibs if matLibs else None
+        self.matLibs = state.matLibs if state else (matLibs if matLibs else None)
 
         self.coreOnly = coreOnly
 
@@ -563,14 +564,15 @@ class centralThimbleGen():
                        h2o_void_percent = 0,
                        CT_open = False,
                        P_imp = None,
-                       coreOnly = True):
+                       coreOnly = True,
+                       state = None):
 
-        self.voidPercent = h2o_void_percent
-        self.h2o_temp_K = h2o_temp_k
-        self.H2ODensity = (1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K)
-        self.P_imp = f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1'         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
+        self.voidPercent = state.h2o_void_percent if state else h2o_void_percent
+        self.h2o_temp_K = state.h2o_temp_K if state else h2o_temp_k
+        self.H2ODensity = state.h2o_density if state else ((1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K))
+        self.P_imp = state.imp if state else (f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1')         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
         self.CT_open = CT_open
-        self.tmp = h2o_temp_mev
+        self.tmp = state.h2o_temp_mev if state else h2o_temp_mev
 
         self.coreOnly = coreOnly
 
@@ -600,13 +602,14 @@ class fluxWires():
                        h2o_temp_k = 294, 
                        h2o_temp_mev = 2.533494e-08,
                        h2o_void_percent = 0,
-                       P_imp = None):
+                       P_imp = None,
+                       state = None):
         
-        self.voidPercent = h2o_void_percent
-        self.h2o_temp_K = h2o_temp_k
-        self.H2ODensity = (1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K)
-        self.P_imp = f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1'         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
-        self.tmp = h2o_temp_mev
+        self.voidPercent = state.h2o_void_percent if state else h2o_void_percent
+        self.h2o_temp_K = state.h2o_temp_K if state else h2o_temp_k
+        self.H2ODensity = state.h2o_density if state else ((1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K))
+        self.P_imp = state.imp if state else (f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1')         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
+        self.tmp = state.h2o_temp_mev if state else h2o_temp_mev
 
         self.fluxWireCard = ''
 
@@ -651,13 +654,14 @@ class rabbit():
                        h2o_temp_mev = 2.533494e-08,
                        h2o_void_percent = 0,
                        rabbit_in = True,
-                       P_imp = None):
+                       P_imp = None,
+                       state = None):
         
-        self.voidPercent = h2o_void_percent
-        self.h2o_temp_K = h2o_temp_k
-        self.H2ODensity = (1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K)
-        self.P_imp = f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1'         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
-        self.tmp = h2o_temp_mev
+        self.voidPercent = state.h2o_void_percent if state else h2o_void_percent
+        self.h2o_temp_K = state.h2o_temp_K if state else h2o_temp_k
+        self.H2ODensity = state.h2o_density if state else ((1-0.01*self.voidPercent) * h2o_density if h2o_density else (1-0.01*self.voidPercent) * genfuncs.find_h2o_temp_K_density(self.h2o_temp_K))
+        self.P_imp = state.imp if state else (f'imp:{",".join(P_imp)}=1' if P_imp else 'imp:n=1')         # Read in the imput card used for particle transport, if no particles inputted then it is set to 'n'
+        self.tmp = state.h2o_temp_mev if state else h2o_temp_mev
         self.rabbitIn = rabbit_in
 
         self.alDensity = 2.70
@@ -795,3 +799,20 @@ class voidCells():
             self.voidCells += f'10001  0  -192399                               {self.P_imp}  $ Void below model\n' \
                               f'10002  0   192399 -192301 132201 132202 132203  {self.P_imp}  $ Void around model\n' \
                               f'10003  0   192301                               {self.P_imp}  $ Void above model\n'
+
+COMPONENT_CACHE = genfuncs.lruCache(maxSize=256)
+
+def cachedComponent(component, *args, **kwargs):
+    '''
+    Same as component(*args, **kwargs) for any generator in this module, but each variant is only rendered once per process.
+    Keyed on the generator and its arguments (lists turned into tuples), a state only by its water conditions and importance
+    (thermalState.waterKey()) so a fuel temperature sweep reuses every variant. Generators that read the state's fuel fields or
+    matLibs (e.g. waterGen) must not go through here. The returned object is shared and must not be modified
+    '''
+    key = (component.__name__,) + tuple(hashable(arg) for arg in args) + tuple((name, hashable(value)) for name, value in sorted(kwargs.items()))
+    return COMPONENT_CACHE.getOrMake(key, lambda: component(*args, **kwargs))
+
+def hashable(value):
+    if isinstance(value, genfuncs.thermalState):
+        return value.waterKey()
+    return tuple(value) if isinstance(value, list) else value
@@ -0,0 +1,114 @@
+import json
+import os
+import numpy as np
+import pandas as pd
+import gendicts
+import sweeps
+try:
+    import tomllib
+except ImportError:     # python before 3.11
+    tomllib = None
+
+# A plan replaces the Setup sheet with a short JSON/TOML/YAML file, e.g. in TOML:
+#
+#   workbook = "MCNPCoreGen.xlsx"       # where the Fuel Info, Tallies, and Settings come from (read through the sidecar cache)
+#   fuel = "inventory.parquet"          # optional CSV/Parquet tables used in place of the workbook's sheets (see PLAN_TABLES),
+#                                       # with all three given the plan needs no workbook at all
+#   base_row = 1                        # optional, starts every case from this Setup row of the workbook
+#   [base]                              # Setup columns (or sweeps.AXES names) every case starts from, on top of base_row
+#   "Core Number" = 50
+#   [[cases]]                           # explicit cases, each only lists what differs from base
+#   safe = 50
+#   [[sweeps]]                          # grid sweeps over base, same axes and values as sweeps.gridSweep
+#   safe = "0:100:10"
+#   water_temp = [20, 40, 60]
+#   [[samples]]                         # sampled cases over base, same arguments as sweeps.sampleSweep
+#   n = 100
+#   axes = {water_temp = "normal:20:2"}
+#
+# Cases are numbered in that order: explicit cases, then every sweep, then every sample
+PLAN_EXTS = ('.json', '.toml', '.yaml', '.yml')
+PLAN_TABLES = {'fuel': 'Fuel Info', 'tallies': 'Tallies', 'settings': 'Settings'}     # plan key -> sheet the CSV/Parquet table stands in for
+PLAN_INPUTS = ('workbook',) + tuple(PLAN_TABLES)     # keys holding input paths, resolved relative to the plan file
+PLAN_OPTIONAL = ('H2O Density', 'H2O Void Percent', 'Ir Core Pos')     # Setup columns a case may leave empty, every other required column needs a value
+
+def is_plan(filePath):
+    return os.path.splitext(filePath)[1].lower() in PLAN_EXTS
+
+def read_plan(filePath):
+    '''
+    Parses a plan file into a dict, input paths in it are made relative to the plan's own folder
+    '''
+    ext = os.path.splitext(filePath)[1].lower()
+    if ext == '.json':
+        with open(filePath) as f:
+            plan = json.load(f)
+    elif ext == '.toml':
+        if tomllib is None:
+            raise ImportError(f"reading '{filePath}' needs python 3.11 or newer (tomllib)")
+        with open(filePath, 'rb') as f:
+            plan = tomllib.load(f)
+    else:
+        try:
+            import yaml     # pyyaml is only needed for .yaml plans
+        except ImportError:
+            raise ImportError(f"reading '{filePath}' needs pyyaml, install it or write the plan as JSON or TOML")
+        with open(filePath) as f:
+            plan = yaml.safe_load(f)
+    for key in PLAN_INPUTS:
+        if key in plan:
+            plan[key] = os.path.join(os.path.dirname(filePath), plan[key])
+    return plan
+
+def plan_tables(plan):
+    '''
+    {sheet: CSV/Parquet path} for every table the plan names (see inputloader.load_inputs)
+    '''
+    return {sheet:plan[key] for key, sheet in PLAN_TABLES.items() if key in plan}
+
+def setup_values(values):
+    '''
+    {Setup column: value} for a plan table, keys may be Setup columns or sweeps.AXES names and values take the column's workbook dtype
+    '''
+    row = {}
+    for key, value in values.items():
+        column = sweeps.AXES.get(key, key)
+        if column not in gendicts.SETUP_DTYPES:
+            raise ValueError(f"unknown Setup column '{key}' in plan")
+        row[column] = float(value) if gendicts.SETUP_DTYPES[column] == 'float64' and value is not None else value
+    return row
+
+def base_row(plan, simdf=None):
+    '''
+    The Setup row every case of the plan starts from, columns that neither base_row nor base set are left empty
+    '''
+    row = {column:np.nan for column in gendicts.SETUP_DTYPES}
+    if 'base_row' in plan:
+        row.update(simdf.iloc[plan['base_row']-1])
+    row.update(setup_values(plan.get('base', {})))
+    return pd.Series(row)
+
+def check_columns(row, given=(), where='base'):
+    '''
+    Raises a ValueError naming the required Setup columns that neither row nor the columns a sweep/sample fills in (given) set
+    '''
+    missing = [column for column in gendicts.REQUIRED_COLUMNS['Setup']
+               if column not in PLAN_OPTIONAL and column not in given and pd.isnull(row.get(column))]
+    if missing:
+        raise ValueError(f"plan {where} leaves required Setup columns {missing} empty, set them in base, base_row, or the {where} itself")
+
+def compile_plan(plan, simdf, inventory):
+    '''
+    The plan's cases as one sweeps.caseChain, sweeps and samples are only expanded into Setup rows as they are read
+    '''
+    base = base_row(plan, simdf)
+    sources = [[pd.Series({**base, **setup_values(case)}) for case in plan.get('cases', [])]]
+    for i, case in enumerate(sources[0]):
+        check_columns(case, where=f'case {i+1}')
+    for i, sweep in enumerate(plan.get('sweeps', [])):
+        sources.append(sweeps.gridSweep(base, **sweep))
+        check_columns(base, sources[-1].columns, f'sweep {i+1}')
+    for i, sample in enumerate(plan.get('samples', [])):
+        check_columns(base, [sweeps.AXES[name] for name in sample.get('axes', {}) if name in sweeps.AXES], f'sample {i+1}')
+        sources.append(sweeps.sampleSweep(base, elements=sweeps.placed_elements(inventory, base['Core Number']), **sample))
+    return sweeps.caseChain(sources)
@@ -0,0 +1,224 @@
+import bisect
+import itertools
+import math
+import warnings
+import numpy as np
+import pandas as pd
+from scipy import stats
+from scipy.stats import qmc
+
+# sweep axis -> Setup column it replaces, listed slowest to fastest varying. The rod heights vary fastest so neighbouring points
+# share their core, composition, and thermal state, and every cached fuel element and component is reused between them
+AXES = {'core': 'Core Number',
+        'hzr': 'H:Zr Ratio',
+        'fuel_temp': 'Fuel Temperature (C)',
+        'water_temp': 'Water Temperature (C)',
+        'pressure': 'H2O Pressure (MPa)',
+        'void': 'H2O Void Percent',
+        'h2o_density': 'H2O Density',
+        'safe': 'Safe Rod',
+        'shim': 'Shim Rod',
+        'reg': 'Reg Rod'}
+
+def span(start, stop, step):
+    '''
+    Evenly spaced values from start to stop with stop included, e.g. span(0, 100, 25) -> [0.0, 25.0, 50.0, 75.0, 100.0]
+    '''
+    count = math.floor((stop - start) / step + 1e-9) + 1
+    return [round(start + i*step, 10) for i in range(max(count, 0))]    # rounded so 0.1 steps do not come out as 0.30000000000000004
+
+def axis_values(values):
+    '''
+    A sweep axis given as one number, a list/range/array of numbers, or a 'start:stop:step' / 'a,b,c' string, as a list of floats
+    '''
+    if isinstance(values, str):
+        if ':' in values:
+            return span(*(float(value) for value in values.split(':')))
+        return [float(value) for value in values.split(',')]
+    if isinstance(values, (int, float)):
+        return [float(values)]
+    return [float(value) for value in values]     # Setup columns are read as float64, this keeps deck names and cache keys the same
+
+class gridSweep():
+    '''
+    Cartesian product of the given axes (see AXES) laid over a base Setup row, every column that is not swept keeps the base row's value.
+    Points are built one at a time, by position (sweep[i]) or in order (iter(sweep)), so a sweep of any size never exists as a DataFrame
+    '''
+    def __init__(self, base, **axes):
+        unknown = set(axes) - set(AXES)
+        if unknown:
+            raise ValueError(f"unknown sweep axes {sorted(unknown)}, expected some of {list(AXES)}")
+        self.base = dict(base)
+        self.axes = {name:axis_values(axes[name]) for name in AXES if name in axes}    # AXES order, whatever order they were given in
+        self.columns = [AXES[name] for name in self.axes]
+
+    def __len__(self):
+        return math.prod(len(values) for values in self.axes.values())
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(f"sweep point {i} out of range")
+        combo = []
+        for values in reversed(list(self.axes.values())):      # mixed radix digits of i, last axis fastest like itertools.product
+            i, digit = divmod(i, len(values))
+            combo.append(values[digit])
+        return self.point(reversed(combo))
+
+    def __iter__(self):
+        for combo in itertools.product(*self.axes.values()):
+            yield self.point(combo)
+
+    def point(self, combo):
+        row = dict(self.base)
+        row.update(zip(self.columns, combo))
+        return pd.Series(row)
+
+SAMPLE_METHODS = ('lhs', 'sobol', 'random')
+MASS_COLUMNS = {'uranium': 'Uranium Now', 'u235': 'U-235 Now', 'pu239': 'Pu-239 Now'}     # per element Fuel Info masses a sample can scale
+
+def distribution(spec):
+    '''
+    Frozen scipy.stats distribution for a spec given as one (anything with a ppf), a tuple, or a string,
+    e.g. ('normal', mean, sd), 'uniform:low:high', or 'triangular:low:mode:high'
+    '''
+    if hasattr(spec, 'ppf'):
+        return spec
+    if isinstance(spec, str):
+        spec = spec.split(':')
+    name, *args = spec
+    args = [float(arg) for arg in args]
+    if name == 'normal':
+        return stats.norm(loc=args[0], scale=args[1])
+    if name == 'uniform':
+        return stats.uniform(loc=args[0], scale=args[1]-args[0])
+    if name == 'triangular':
+        return stats.triang(c=(args[1]-args[0])/(args[2]-args[0]), loc=args[0], scale=args[2]-args[0])
+    raise ValueError(f"unknown distribution '{name}', expected normal, uniform, triangular, or a scipy.stats distribution")
+
+def unit_samples(method, n, d, rng):
+    '''
+    n points in the d dimensional unit hypercube, stratified per dimension (lhs), low discrepancy (sobol), or plain random
+    '''
+    if method == 'random':
+        return rng.random((n, d))
+    engine = qmc.LatinHypercube if method == 'lhs' else qmc.Sobol
+    try:
+        sampler = engine(d, rng=rng)
+    except TypeError:       # scipy before 1.15 calls it seed
+        sampler = engine(d, seed=rng)
+    if method == 'sobol' and n & (n-1):
+        print(f"   comment. {n} is not a power of 2, the sobol points will not be fully balanced")
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return sampler.random(n)
+
+def mass_column(column, element):
+    return f'{column} Scale FE{element}'
+
+def mass_scales(setupRow):
+    '''
+    {Fuel Element: {Fuel Info mass column: factor}} for the sampled masses carried by a sample point (empty for any other Setup row)
+    '''
+    scales = {}
+    for column in MASS_COLUMNS.values():
+        prefix = mass_column(column, '')
+        for key in setupRow.keys():
+            if isinstance(key, str) and key.startswith(prefix):
+                scales.setdefault(int(key[len(prefix):]), {})[column] = setupRow[key]
+    return scales
+
+class sampleSweep():
+    '''
+    n cases drawn from distributions over Setup columns (see AXES) and relative per element fuel masses (see MASS_COLUMNS), laid over a base Setup row.
+    Every draw is made up front in one vectorized pass and kept as an n by d array, points are turned into Setup rows one at a time like gridSweep.
+    The seed is always recorded (one is drawn when none is given) so table() and a rerun with the same seed reproduce every case
+    '''
+    def __init__(self, base, n, axes=None, masses=None, elements=(), method='lhs', seed=None, decimals=3):
+        axes = axes if axes else {}
+        masses = masses if masses else {}
+        unknown = set(axes) - set(AXES) | set(masses) - set(MASS_COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown sample axes {sorted(unknown)}, expected some of {list(AXES)} and {list(MASS_COLUMNS)}")
+        if 'core' in axes:
+            raise ValueError("the core number can not be sampled, set it with the base row")
+        if method not in SAMPLE_METHODS:
+            raise ValueError(f"unknown sampling method '{method}', expected one of {SAMPLE_METHODS}")
+        self.base = dict(base)
+        self.n = n
+        self.method = method
+        self.seed = seed if seed is not None else int(np.random.SeedSequence().entropy % 2**63)
+        self.columns = [AXES[name] for name in axes]
+        self.massColumns = [mass_column(MASS_COLUMNS[name], element) for name in masses for element in elements]
+        blocks = [(distribution(axes[name]), 1) for name in axes] + [(distribution(masses[name]), len(elements)) for name in masses]    # (distribution, columns it fills)
+        self.values = unit_samples(method, n, len(self.columns) + len(self.massColumns), np.random.default_rng(self.seed))
+        start = 0
+        for dist, width in blocks:      # maps the unit draws through each inverse cdf, a whole block of element masses at a time
+            self.values[:, start:start+width] = dist.ppf(self.values[:, start:start+width])
+            start += width
+        self.values[:, :len(self.columns)] = self.values[:, :len(self.columns)].round(decimals)  # keeps deck names short, masses keep full precision
+
+    def __len__(self):
+        return self.n
+
+    def __getitem__(self, i):
+        if not 0 <= i < self.n:
+            raise IndexError(f"sample {i} out of range")
+        return self.point(self.values[i])
+
+    def __iter__(self):
+        for values in self.values:
+            yield self.point(values)
+
+    def point(self, values):
+        row = dict(self.base)
+        row.update(zip(self.columns + self.massColumns, values.tolist()))
+        return pd.Series(row)
+
+    def table(self, first=1):
+        '''
+        Every sampled value as a DataFrame, one row per case in deck order numbered from first (the deck number of the first case)
+        '''
+        return pd.DataFrame(self.values, columns=self.columns + self.massColumns, index=pd.RangeIndex(first, first+self.n, name='Case'))
+
+    def tableCsv(self, first=1):
+        '''
+        table() as csv text under a '# method=... seed=... n=...' line (read it back with pd.read_csv(path, comment='#'))
+        '''
+        return f'# method={self.method} seed={self.seed} n={self.n}\n' + self.table(first).to_csv(lineterminator='\n')
+
+    def writeTable(self, path, first=1):
+        with open(path, 'w', newline='') as f:
+            f.write(self.tableCsv(first))
+
+def placed_elements(inventory, coreNo):
+    '''
+    Fuel Element ids placed in a core, the elements a sampleSweep draws masses for
+    '''
+    return [inventory.records[item]["Fuel Element"] for item in inventory.placed(f"Core {int(coreNo)}")]
+
+class caseChain():
+    '''
+    Several case sources (gridSweep, sampleSweep, or a list of Setup rows) numbered one after the other
+    '''
+    def __init__(self, sources):
+        self.sources = sources
+        self.offsets = list(itertools.accumulate((len(source) for source in sources), initial=0))     # number of the first case of each source
+
+    def __len__(self):
+        return self.offsets[-1]
+
+    def __getitem__(self, i):
+        if not 0 <= i < len(self):
+            raise IndexError(f"case {i} out of range")
+        j = bisect.bisect_right(self.offsets, i) - 1    # right so empty sources are skipped
+        return self.sources[j][i - self.offsets[j]]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.sources)
+
+def sample_tables(cases):
+    '''
+    {file name: csv text} of the sample table of every sampleSweep in cases, numbered by deck
+    '''
+    found = list(zip(cases.offsets, cases.sources)) if isinstance(cases, caseChain) else [(0, cases)]
+    return {f'samples_{source.method}_{source.seed}.csv':source.tableCsv(offset+1) for offset, source in found if isinstance(source, sampleSweep)}
@@ -0,0 +1,160 @@
+import functools
+import numpy as np
+
+LEGACY_MIN_C = 0.0          # range the 1 atm polynomial is good for
+LEGACY_MAX_C = 150.0
+TABLE_STEP_C = 0.01         # the legacy density is evaluated at temperatures rounded to 0.01 C, so a 0.01 C table is exact
+
+IF97_MIN_K = 273.15         # IAPWS-IF97 region 1 (compressed liquid) bounds
+IF97_MAX_K = 623.15
+IF97_STEP_K = 0.05
+IF97_R = 0.461526           # kJ/(kg K), specific gas constant of water used by IF97
+IF97_P_STAR = 16.53         # MPa
+IF97_T_STAR = 1386.0        # K
+IF97_CRITICAL_MPA = 22.064  # above the critical pressure region 1 has no saturation line to stay under
+# n1 ... n10 of the IF97 region 4 saturation line
+IF97_REGION4 = (0.11670521452767e4, -0.72421316703206e6, -0.17073846940092e2, 0.12020824702470e5, -0.32325550322333e7,
+                0.14915108613530e2, -0.48232657361591e4, 0.40511340542057e6, -0.23855557567849, 0.65017534844798e3)
+# (I, J, n) of the IF97 region 1 Gibbs free energy
+IF97_REGION1 = np.array([
+    (0, -2, 0.14632971213167), (0, -1, -0.84548187169114), (0, 0, -0.37563603672040e1), (0, 1, 0.33855169168385e1),
+    (0, 2, -0.95791963387872), (0, 3, 0.15772038513228), (0, 4, -0.16616417199501e-1), (0, 5, 0.81214629983568e-3),
+    (1, -9, 0.28319080123804e-3), (1, -7, -0.60706301565874e-3), (1, -1, -0.18990068218419e-1), (1, 0, -0.32529748770505e-1),
+    (1, 1, -0.21841717175414e-1), (1, 3, -0.52838357969930e-4), (2, -3, -0.47184321073267e-3), (2, 0, -0.30001780793026e-3),
+    (2, 1, 0.47661393906987e-4), (2, 3, -0.44141845330846e-5), (2, 17, -0.72694996297594e-15), (3, -4, -0.31679644845054e-4),
+    (3, 0, -0.28270797985312e-5), (3, 6, -0.85205128120103e-9), (4, -5, -0.22425281908000e-5), (4, -2, -0.65171222895601e-6),
+    (4, 10, -0.14341729937924e-12), (5, -8, -0.40516996860117e-6), (8, -11, -0.12734301741641e-8), (8, -6, -0.17424871230634e-9),
+    (21, -29, -0.68762131295531e-18), (23, -31, 0.14478307828521e-19), (29, -38, 0.26335781662795e-22), (30, -39, -0.11947622640071e-22),
+    (31, -40, 0.18228094581404e-23), (32, -41, -0.93537087292458e-25)])
+
+WARNED = set()      # out of range temperatures (C), and (temperature, pressure) steam states, that have already been reported
+
+def legacy_polynomial(C):
+    '''
+    Water density (g/cc) at 1 atm for temperatures in C, works for 0 to 150 C
+    https://www.ncbi.nlm.nih.gov/pmc/articles/PMC4909168/
+    '''
+    return (999.83952
+            +16.945176*C
+            -7.9870401e-3*C**2
+            -46.170461e-6*C**3
+            +105.56302e-9*C**4
+            -280.54253e-12*C**5)/(1+16.897850e-3*C)/1000
+
+def round6(values):
+    # same decimal rounding as '{:.6f}'.format(), which np.round does not always reproduce
+    return np.array([float('{:.6f}'.format(value)) for value in np.ravel(values)]).reshape(np.shape(values))
+
+def hundredths(C):
+    '''
+    Finite temperatures rounded to 0.01 C, as integer hundredths. Rounds like '{:.2f}'.format() (the legacy function) does, values that sit
+    on a half hundredth are few and are rounded one by one so floating point error in the scaling never tips them the wrong way
+    '''
+    shape = np.shape(C)
+    C = np.atleast_1d(C)
+    scaled = C * 100
+    index = np.rint(scaled)
+    tie = np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6
+    if np.any(tie):
+        index[tie] = [round(float('{:.2f}'.format(value)) * 100) for value in C[tie]]
+    return index.astype(np.int64).reshape(shape)
+
+@functools.lru_cache(maxsize=None)
+def legacy_table():
+    '''
+    Legacy density at every 0.01 C from 0 to 150 C, built once per process
+    '''
+    steps = int(round((LEGACY_MAX_C - LEGACY_MIN_C) / TABLE_STEP_C))
+    C = np.array([float('{:.2f}'.format(LEGACY_MIN_C + i*TABLE_STEP_C)) for i in range(steps + 1)])
+    return round6(legacy_polynomial(C))
+
+def warn_out_of_range(C, density, low, high, model):
+    for temp, dens in zip(np.ravel(C), np.ravel(density)):
+        if (temp < low or temp > high) and temp not in WARNED:
+            WARNED.add(temp)
+            print(f"\n   warning. h2o has calculated density {dens} g/cc at given temp {temp} C")
+            print(f"   warning. but that is outside the range {low:g} - {high:g} C safely predicted by the {model}")
+
+def h2o_density(temp_K, pressure_MPa=None, void_percent=0):
+    '''
+    Water density in g/cc for a temperature or a whole array of temperatures (K) in one call, optionally with void percents (broadcast).
+    Without a pressure this is the 1 atm polynomial, looked up from a 0.01 C table and identical to what genfuncs.find_h2o_temp_K_density() always gave.
+    With a pressure (MPa) it interpolates an IAPWS-IF97 region 1 table, good for liquid water up to 350 C, rounded to 6 decimals like the 1 atm densities.
+    Temperatures outside the model's range, or at or above the boiling point at the given pressure, are still evaluated and reported once each.
+    '''
+    if pressure_MPa is not None:
+        density = pressurized_density(temp_K, pressure_MPa)
+    else:
+        T = np.asarray(temp_K, dtype=np.float64)
+        known = np.isfinite(T)      # a missing (NaN) temperature has a NaN density, like the legacy function gave
+        index = hundredths(np.where(known, T - 273.15, LEGACY_MIN_C)) - int(round(LEGACY_MIN_C / TABLE_STEP_C))
+        C = (index + int(round(LEGACY_MIN_C / TABLE_STEP_C))) / 100
+        inRange = (index >= 0) & (index < len(legacy_table()))
+        density = np.where(inRange, legacy_table()[np.clip(index, 0, len(legacy_table()) - 1)], 0.0)
+        if not inRange.all():       # evaluated directly outside the table, same as the legacy function did
+            density = np.where(inRange, density, round6(legacy_polynomial(C)))
+            warn_out_of_range(C[~inRange], density[~inRange], LEGACY_MIN_C, LEGACY_MAX_C, 'formula')
+        density = np.where(known, density, np.nan)
+    density = (1 - 0.01*np.asarray(void_percent, dtype=np.float64)) * density if np.any(void_percent) else density
+    return float(density) if np.ndim(density) == 0 else density
+
+def saturation_K(pressure_MPa):
+    '''
+    IAPWS-IF97 region 4 saturation temperature (K) at a pressure (MPa), inf above the critical pressure where water never boils
+    '''
+    n1, n2, n3, n4, n5, n6, n7, n8, n9, n10 = IF97_REGION4
+    p = np.asarray(pressure_MPa, dtype=np.float64)
+    beta = np.minimum(p, IF97_CRITICAL_MPA)**0.25
+    E = beta**2 + n3*beta + n6
+    F = n1*beta**2 + n4*beta + n7
+    G = n2*beta**2 + n5*beta + n8
+    D = 2*G / (-F - np.sqrt(F**2 - 4*E*G))
+    T = (n10 + D - np.sqrt((n10 + D)**2 - 4*(n9 + n10*D))) / 2
+    return np.where(p > IF97_CRITICAL_MPA, np.inf, T)
+
+def warn_saturated(temp_K, pressure_MPa, density):
+    '''
+    Reports (once each) temperatures at or above the boiling point at their pressure, where the region 1 liquid density does not apply
+    '''
+    T, p = np.broadcast_arrays(np.asarray(temp_K, dtype=np.float64), np.asarray(pressure_MPa, dtype=np.float64))
+    density = np.broadcast_to(density, T.shape)
+    boiling = T >= saturation_K(p)
+    for temp, pressure, dens in zip(T[boiling], p[boiling], density[boiling]):
+        if (temp, pressure) not in WARNED:
+            WARNED.add((temp, pressure))
+            print(f"\n   warning. h2o has calculated density {dens} g/cc at given temp {temp - 273.15:.2f} C and {pressure:g} MPa")
+            print(f"   warning. but water boils at {saturation_K(pressure) - 273.15:.2f} C at that pressure, so it is steam and not the liquid the IAPWS-IF97 region 1 fit describes")
+
+def if97_density(temp_K, pressure_MPa):
+    '''
+    IAPWS-IF97 region 1 density (g/cc), evaluated directly (vectorized over temperature and pressure)
+    '''
+    T = np.asarray(temp_K, dtype=np.float64)[..., np.newaxis]
+    p = np.asarray(pressure_MPa, dtype=np.float64)[..., np.newaxis]
+    I, J, n = IF97_REGION1[:, 0], IF97_REGION1[:, 1], IF97_REGION1[:, 2]
+    pi = p / IF97_P_STAR
+    tau = IF97_T_STAR / T
+    gamma_pi = np.sum(-n * I * (7.1 - pi)**(I - 1) * (tau - 1.222)**J, axis=-1)
+    volume = IF97_R * T[..., 0] / (p[..., 0] * 1000) * pi[..., 0] * gamma_pi        # m3/kg
+    return 1 / volume / 1000
+
+@functools.lru_cache(maxsize=16)
+def pressurized_table(pressure_MPa):
+    '''
+    (temperatures K, densities g/cc) every 0.05 K over region 1 at one pressure, built once per pressure
+    '''
+    T = np.linspace(IF97_MIN_K, IF97_MAX_K, int(round((IF97_MAX_K - IF97_MIN_K) / IF97_STEP_K)) + 1)
+    return T, if97_density(T, pressure_MPa)
+
+def pressurized_density(temp_K, pressure_MPa):
+    T = np.asarray(temp_K, dtype=np.float64)
+    temps, densities = pressurized_table(float(pressure_MPa))
+    density = np.interp(T, temps, densities)
+    outside = (T < IF97_MIN_K) | (T > IF97_MAX_K)
+    if np.any(outside):
+        density = np.where(outside, if97_density(T, pressure_MPa), density)
+    density = round6(density)       # same 6 decimals as the 1 atm densities
+    if np.any(outside):
+        warn_out_of_range(np.round(T[outside] - 273.15, 2), density[outside], IF97_MIN_K - 273.15, IF97_MAX_K - 273.15, 'IAPWS-IF97 region 1 fit')
+    warn_saturated(T, pressure_MPa, density)
+    return density
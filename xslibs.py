@@ -0,0 +1,133 @@
+import bisect
+import gendicts
+from scipy import constants
+
+K_PER_MEV = 1 / (constants.k / constants.e * 1e-6)     # kelvin per MeV of kT, xsdir temperatures are given as kT in MeV
+
+# name used in matLibs -> built-in table of {temperature (K): ZAID / S(a,b) id}
+DEFAULT_TABLES = {'U235': gendicts.U235_TEMPS_K_XS_DICT,
+                  'U238': gendicts.U238_TEMPS_K_XS_DICT,
+                  'PU239': gendicts.PU239_TEMPS_K_XS_DICT,
+                  'SM149': gendicts.SM149_TEMPS_K_XS_DICT,
+                  'ZR': gendicts.ZR_TEMPS_K_XS_DICT,
+                  'H': gendicts.H_TEMPS_K_XS_DICT,
+                  'O': gendicts.O_TEMPS_K_XS_DICT,
+                  'ZRH': gendicts.ZR_H_TEMPS_K_SAB_DICT,
+                  'HZR': gendicts.H_ZR_TEMPS_K_SAB_DICT,
+                  'H2O': gendicts.H2O_TEMPS_K_SAB_DICT}
+
+# name used in matLibs -> table names it can go by in an xsdir (ENDF/B-VIII style first, older S(a,b) names after)
+XSDIR_NAMES = {'U235': ('92235',),
+               'U238': ('92238',),
+               'PU239': ('94239',),
+               'SM149': ('62149',),
+               'ZR': ('40000',),
+               'H': ('1001',),
+               'O': ('8016',),
+               'ZRH': ('zr-zrh', 'zr/h'),
+               'HZR': ('h-zrh', 'h/zr'),
+               'H2O': ('h-h2o', 'lwtr')}
+
+FUEL_TEMP_LIBS = ('U235', 'U238', 'PU239', 'SM149', 'ZR', 'H', 'O')    # looked up at the fuel temperature (O is used in the light water mat)
+
+class xsResolver():
+    '''
+    Resolves cross-section and S(a,b) table ids by temperature. Every table is kept as a sorted temperature index searched with bisect,
+    and each (table, temperature) lookup is memoized, so the cost does not grow with the number of nuclides or temperatures.
+    Picks the closest available temperature, on a tie the entry listed first in the source table wins (same as genfuncs.find_closest_value)
+    '''
+    def __init__(self, tables=None):
+        self.index = {}         # name -> (sorted temperatures, ids, source order)
+        self.memo = {}          # (name, temperature) -> id
+        self.matLibsMemo = {}   # (fuel temperature, water temperature) -> matLibs dict
+        for name, table in (tables if tables else DEFAULT_TABLES).items():
+            self.addTable(name, table)
+
+    def addTable(self, name, table):
+        entries = sorted((temp, rank, libId) for rank, (temp, libId) in enumerate(table.items()))
+        self.index[name] = ([entry[0] for entry in entries], [entry[2] for entry in entries], [entry[1] for entry in entries])
+        self.memo = {key:value for key, value in self.memo.items() if key[0] != name}
+        self.matLibsMemo = {}
+
+    def resolve(self, name, temp_K):
+        '''
+        Id of the named table closest to temp_K
+        '''
+        key = (name, temp_K)
+        if key not in self.memo:
+            temps, ids, ranks = self.index[name]
+            i = bisect.bisect_left(temps, temp_K)
+            candidates = [j for j in (i-1, i) if 0 <= j < len(temps)]
+            best = min(candidates, key=lambda j: (abs(temps[j] - temp_K), ranks[j]))
+            self.memo[key] = ids[best]
+        return self.memo[key]
+
+    def matLibs(self, uzrh_temp_K=294, h2o_temp_K=294):
+        '''
+        Full matLibs dictionary (same keys fuelGen.findMatLibs()/findMtLibs() fill) for the given fuel and water temperatures.
+        The returned dict is shared between callers and must not be modified.
+        '''
+        key = (uzrh_temp_K, h2o_temp_K)
+        if key not in self.matLibsMemo:
+            libs = {name:self.resolve(name, uzrh_temp_K) for name in FUEL_TEMP_LIBS}
+            libs['ZRH'] = self.resolve('ZRH', uzrh_temp_K)
+            libs['HZR'] = self.resolve('HZR', uzrh_temp_K)
+            libs['H2O'] = self.resolve('H2O', h2o_temp_K)
+            self.matLibsMemo[key] = libs
+        return self.matLibsMemo[key]
+
+    @classmethod
+    def fromXsdir(cls, xsdirPath):
+        '''
+        Builds a resolver from a local MCNP xsdir. Every table the xsdir lists for a name in XSDIR_NAMES replaces the built-in table for it,
+        names the xsdir does not carry (e.g. natural Zr in ENDF/B-VIII) keep the built-in ids.
+        '''
+        found = read_xsdir(xsdirPath)
+        resolver = cls()
+        for name, aliases in XSDIR_NAMES.items():
+            for alias in aliases:
+                if alias in found:
+                    resolver.addTable(name, found[alias])
+                    break
+            else:
+                print(f"   comment. no '{name}' tables in {xsdirPath}, using the built-in ids")
+        return resolver
+
+def read_xsdir(xsdirPath):
+    '''
+    Reads the directory section of an xsdir into {table name: {temperature (K): id}}, e.g. {'92235': {293.6: '92235.80c', ...}}.
+    Only continuous energy ('c') and thermal scattering ('t') tables are kept, the first id listed at a temperature wins.
+    '''
+    tables = {}
+    with open(xsdirPath) as f:
+        for line in f:
+            if line.strip().lower().startswith('directory'):
+                break
+        entry = ''
+        for line in f:
+            entry += line.strip()
+            if entry.endswith('+'):         # entry continues on the next line
+                entry = entry[:-1] + ' '
+                continue
+            fields = entry.split()
+            entry = ''
+            if len(fields) < 10 or '.' not in fields[0] or fields[0][-1] not in 'ct':
+                continue
+            name = fields[0].rsplit('.', 1)[0]
+            try:
+                temp_K = round(float(fields[9]) * K_PER_MEV, 1)
+            except ValueError:
+                continue
+            tables.setdefault(name, {}).setdefault(temp_K, fields[0])
+    return tables
+
+DEFAULT_RESOLVER = None
+
+def default_resolver():
+    '''
+    Resolver over the built-in gendicts tables, built once per process
+    '''
+    global DEFAULT_RESOLVER
+    if DEFAULT_RESOLVER is None:
+        DEFAULT_RESOLVER = xsResolver()
+    return DEFAULT_RESOLVER